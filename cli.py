@@ -129,8 +129,64 @@ class CLI:
         jit.add_argument('-save', '--save-as', type=str,
                          help='Filename to save the partition (overwrites if exists)')
     
+        # build-index: offline HaveIBeenPwned index
+        build_index = utils_subparsers.add_parser('build-index', help='Build an offline HaveIBeenPwned index from a Pwned Passwords SHA-1 file')
+        build_index.add_argument('-i', '--input', type=str, required=True,
+                                 help='Pwned Passwords SHA-1 file, ordered by hash (HASH:COUNT lines)')
+        build_index.add_argument('-o', '--output', type=str, required=True,
+                                 help='Index file to write (overwrites if exists)')
+        build_index.add_argument('-v', '--verbose',
+                                 action='store_true',
+                                 help='Print progress while indexing')
+    
+        # build-titles: offline Wikipedia title corpus
+        build_titles = utils_subparsers.add_parser('build-titles', help='Build an offline Wikipedia title corpus for pp -w from a titles dump')
+        build_titles.add_argument('-i', '--input', type=str, required=True,
+                                  help='Titles dump, one title per line, optionally gzipped (e.g. enwiki-latest-all-titles-in-ns0.gz)')
+        build_titles.add_argument('-o', '--output', type=str, required=True,
+                                  help='Corpus file to write (overwrites if exists)')
+        build_titles.add_argument('-ml', '--max-length', type=int, default=40,
+                                  help='Leave out titles longer than this once cleaned (default: 40)')
+        build_titles.add_argument('-v', '--verbose',
+                                  action='store_true',
+                                  help='Print progress while building')
+
+        # build-filter: Bloom filter prefilter for pwnage checks
+        build_filter = utils_subparsers.add_parser('build-filter', help='Build a Bloom filter for fast pwnage prefiltering from a Pwned Passwords SHA-1 file or offline index')
+        build_filter.add_argument('-i', '--input', type=str, required=True,
+                                  help="Pwned Passwords SHA-1 file (HASH:COUNT lines) or an index built with 'utils build-index'")
+        build_filter.add_argument('-o', '--output', type=str, required=True,
+                                  help='Filter file to write (overwrites if exists)')
+        build_filter.add_argument('-fp', '--fp-rate', type=float, default=0.01,
+                                  help='False positive rate; lower rates need a bigger filter, built in memory (default: 0.01, about 1.1 GB for the full dump)')
+        build_filter.add_argument('-v', '--verbose',
+                                  action='store_true',
+                                  help='Print progress while building')
+    
         # Add arguments to the pwnage subparser
         pwn_parser.add_argument('password')
+        pwn_parser.add_argument('-off', '--offline',
+                              help="Check pwnage against an offline index built with 'utils build-index' instead of the HaveIBeenPwned API. Nothing is sent over the network. Default = use the API.",
+                              type=str,
+                              default=None,
+                              metavar='INDEX')
+        pwn_parser.add_argument('-pf', '--prefilter',
+                              help="Screen passwords with a Bloom filter built with 'utils build-filter' first; only its hits are confirmed with the offline index or the HaveIBeenPwned API. Default = no prefilter.",
+                              type=str,
+                              default=None,
+                              metavar='FILTER')
+        pwn_parser.add_argument('--hibp-url',
+                              help="Base URL of the Pwned Passwords range API, e.g. a local stand-in started with hibp_server.py. Default = https://api.pwnedpasswords.com.",
+                              type=str,
+                              default=None,
+                              metavar='URL')
+        pwn_parser.add_argument('-hc', '--hibp-cache',
+                              help="Cache HaveIBeenPwned range responses on disk (in ~/.cache/hwtp) and reuse them for this many hours. Default = no cache; 24 hours if given without a value.",
+                              type=float,
+                              nargs='?',
+                              const=24,
+                              default=None,
+                              metavar='HOURS')
     
         # Add arguments to the password subparser
         pw_parser.add_argument('-c', '--chars',
@@ -161,7 +217,7 @@ class CLI:
                                metavar='Disallow Character Classes', 
                                help='Disallow entire classes of characters. Possible values are: \
                                (u)ppercase, (l)owercase, (d)igits, and (s)pecial characters (i.e., punctuation). Default = all character classes allowed.')
-        pw_parser.add_argument('-x', '--xtra', help="Give the passphrase an extra shuffle for good luck. Default = don't shuffle an extra time", action='store_true')
+        pw_parser.add_argument('-x', '--xtra', help="Give the password an extra shuffle for good luck (passwords are already drawn uniformly, so this only affects very large policies). Default = don't shuffle an extra time", action='store_true')
         pw_parser.add_argument('-md', '--mindigits',
                               help='Minimum number of digits to use in the passphrase. Default = 0.',
                               type=int,
@@ -191,6 +247,39 @@ class CLI:
                               help="Submit generated passwords to HaveIBeenPwned to check if they have already been found in a databreach.",
                               action='store_true',
                               default=False)
+        pw_parser.add_argument('-clean',
+                              help="Check candidates with HaveIBeenPwned while generating them and replace any pwned ones, so exactly -n clean results are returned (implies -pwn).",
+                              action='store_true',
+                              default=False)
+        pw_parser.add_argument('-off', '--offline',
+                              help="Check pwnage against an offline index built with 'utils build-index' instead of the HaveIBeenPwned API. Nothing is sent over the network. Default = use the API.",
+                              type=str,
+                              default=None,
+                              metavar='INDEX')
+        pw_parser.add_argument('-pf', '--prefilter',
+                              help="Screen passwords with a Bloom filter built with 'utils build-filter' first; only its hits are confirmed with the offline index or the HaveIBeenPwned API. Default = no prefilter.",
+                              type=str,
+                              default=None,
+                              metavar='FILTER')
+        pw_parser.add_argument('--hibp-url',
+                              help="Base URL of the Pwned Passwords range API, e.g. a local stand-in started with hibp_server.py. Default = https://api.pwnedpasswords.com.",
+                              type=str,
+                              default=None,
+                              metavar='URL')
+        pw_parser.add_argument('-hc', '--hibp-cache',
+                              help="Cache HaveIBeenPwned range responses on disk (in ~/.cache/hwtp) and reuse them for this many hours. Default = no cache; 24 hours if given without a value.",
+                              type=float,
+                              nargs='?',
+                              const=24,
+                              default=None,
+                              metavar='HOURS')
+        pw_parser.add_argument('-m', '--mask',
+                              help="Generate passwords matching a mask, one character class per position: ?u uppercase, ?l lowercase, ?d digit, ?s special, ?a any, ?? a literal '?', anything else is literal (e.g. '?u?l?l?l-?d?d?d?d-?s'). The mask sets the length and classes, so -c, -md, -ms, -nc, -b, -no and -x are ignored. Default = no mask.",
+                              default=str())
+        pw_parser.add_argument('--entropy-json',
+                              help="Print the exact entropy of the requested password policy as JSON and exit.",
+                              action='store_true',
+                              default=False)
     
         # Add arguments to the passphrase subparser
         pp_parser.add_argument('-c', '--chars',
@@ -225,6 +314,12 @@ class CLI:
                               help='Use Wikipedia as the source for passphrases. Smushes together three (3) randomly selected Wikipedia article titles as the base of the passphrase.',
                               action='store_true',
                               default=False)
+        pp_parser.add_argument('-wc', '--wiki-corpus',
+                              help="With -w, sample titles from an offline corpus built with 'utils build-titles' instead of asking Wikipedia. "
+                                   "The titles of each passphrase then add up to exactly -c characters. Default = use Wikipedia.",
+                              type=str,
+                              default=None,
+                              metavar='CORPUS')
         pp_parser.add_argument('-au', '--augenbaumize',
                               help="Use the Augenbaum method. Default = Don't do it.",
                               default=False)
@@ -236,6 +331,32 @@ class CLI:
                               help="Submit generated passwords to HaveIBeenPwned to check if they have already been found in a databreach.",
                               action='store_true',
                               default=False)
+        pp_parser.add_argument('-clean',
+                              help="Check candidates with HaveIBeenPwned while generating them and replace any pwned ones, so exactly -n clean results are returned (implies -pwn).",
+                              action='store_true',
+                              default=False)
+        pp_parser.add_argument('-off', '--offline',
+                              help="Check pwnage against an offline index built with 'utils build-index' instead of the HaveIBeenPwned API. Nothing is sent over the network. Default = use the API.",
+                              type=str,
+                              default=None,
+                              metavar='INDEX')
+        pp_parser.add_argument('-pf', '--prefilter',
+                              help="Screen passwords with a Bloom filter built with 'utils build-filter' first; only its hits are confirmed with the offline index or the HaveIBeenPwned API. Default = no prefilter.",
+                              type=str,
+                              default=None,
+                              metavar='FILTER')
+        pp_parser.add_argument('--hibp-url',
+                              help="Base URL of the Pwned Passwords range API, e.g. a local stand-in started with hibp_server.py. Default = https://api.pwnedpasswords.com.",
+                              type=str,
+                              default=None,
+                              metavar='URL')
+        pp_parser.add_argument('-hc', '--hibp-cache',
+                              help="Cache HaveIBeenPwned range responses on disk (in ~/.cache/hwtp) and reuse them for this many hours. Default = no cache; 24 hours if given without a value.",
+                              type=float,
+                              nargs='?',
+                              const=24,
+                              default=None,
+                              metavar='HOURS')
         pp_parser.add_argument("-pad", 
                                type=str, 
                                nargs=2, 
@@ -1,97 +1,129 @@
+# LIBRARIES
+import re
+import sys
+
 # MODULES
 from colorama import init, Fore, Back, Style
 
+# colorama only needs to wrap stdout once per process
+_colorama_ready = False
+
+# LOOKUP TABLES
+# color name -> escape code, for foreground 'f' and background 'b'
+_FORE = {
+  'BLACK': Fore.BLACK, 'RED': Fore.RED, 'GREEN': Fore.GREEN, 'YELLOW': Fore.YELLOW,
+  'BLUE': Fore.BLUE, 'MAGENTA': Fore.MAGENTA, 'CYAN': Fore.CYAN, 'WHITE': Fore.WHITE,
+}
+_BACK = {
+  'BLACK': Back.BLACK, 'RED': Back.RED, 'GREEN': Back.GREEN, 'YELLOW': Back.YELLOW,
+  'BLUE': Back.BLUE, 'MAGENTA': Back.MAGENTA, 'CYAN': Back.CYAN, 'WHITE': Back.WHITE,
+}
+_STYLE = {'DIM': Style.DIM, 'NORMAL': Style.NORMAL, 'BRIGHT': Style.BRIGHT}
+_RESET = {'f': Fore.RESET, 'b': Back.RESET, 's': Style.RESET_ALL}
+
+
+def _class_escape(ch):
+  # uppercase = red, lowercase = blue, digits = green, everything else = magenta
+  if ch.isalpha():
+    return Fore.RED if ch.isupper() else Fore.BLUE
+  elif ch.isnumeric():
+    return Fore.GREEN
+  return Fore.MAGENTA
+
+
+# character -> escape code for its character class, precomputed for printable ASCII
+# and filled in lazily for anything else (e.g. non-Latin passphrase dictionaries)
+_CLASS_ESCAPES = {chr(i): _class_escape(chr(i)) for i in range(32, 127)}
+
+
+def colorize(text):
+  """
+  Colorize text by character class. An escape code is only emitted when the
+  class changes, and the result is built with a single join.
+  """
+  table = _CLASS_ESCAPES
+  parts = []
+  current = None
+  start = 0
+  for i, ch in enumerate(text):
+    esc = table.get(ch)
+    if esc is None:
+      esc = table[ch] = _class_escape(ch)
+    if esc is not current:
+      if current is not None:
+        parts.append(current)
+        parts.append(text[start:i])
+      current = esc
+      start = i
+  if current is not None:
+    parts.append(current)
+    parts.append(text[start:])
+  parts.append(Style.RESET_ALL)  # terminate color commands
+  return ''.join(parts)
+
+
+# matches the escape codes colorize() and Color emit
+_ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def strip(text):
+  """Remove color escape codes, e.g. before hashing a colorized password."""
+  return _ANSI_ESCAPE.sub('', text)
+
 
 class Color:
-  def __init__(self):
-    init(autoreset=True)
+  def __init__(self, enabled=None):
+    """
+    enabled = None turns colors on only when stdout is a terminal, so piped or
+    redirected output stays plain.
+    """
+    global _colorama_ready
+    if enabled is None:
+      try:
+        enabled = sys.stdout.isatty()
+      except (AttributeError, ValueError):
+        enabled = False
+    self.enabled = enabled
+    if not _colorama_ready:
+      init(autoreset=True)
+      _colorama_ready = True
+
+  def colorize(self, text):
+    # fast path used for generated passphrases and passwords
+    if not self.enabled:
+      return text
+    return colorize(text)
 
   def p(self, text, color_str=None):
     # currently can only change foreground 'f' color
     # Fore: BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, RESET.
     # Back: BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, RESET.
     # Style: DIM, NORMAL, BRIGHT, RESET_ALL
+    if not self.enabled:
+      return text
     try:
-      color_str = color_str.lower()
-    except:
+      color_str = color_str.upper()
+    except AttributeError:
       pass
-    
-    if color_str == 'red':
-      return(self.color('RED', 'f') + text)
-    elif color_str == 'green':
-      return(self.color('GREEN', 'f') + text)
-    elif color_str == 'blue':
-      return(self.color('BLUE', 'f') + text)
-    elif color_str == 'yellow':
-      return(self.color('YELLOW', 'f') + text)
-    elif color_str == 'magenta':
-      return(self.color('MAGENTA', 'f') + text)
-    elif color_str == 'cyan':
-      return(self.color('CYAN', 'f') + text)
-    elif color_str == 'white':
-      return(self.color('WHITE', 'f') + text)
-    else:
-      return(self.color('RESET_ALL', 's') + text)
+    if color_str in _FORE and color_str != 'BLACK':
+      return _FORE[color_str] + text
+    return Style.RESET_ALL + text
 
   def color(self, color_str, fbs='f'):
+    if not self.enabled:
+      return ''
     try:
       color_str = color_str.upper()
-    except:
+    except AttributeError:
       pass
     fbs = fbs.lower()
-    if color_str == 'BLACK':
-      if fbs == 'f':
-        return Fore.BLACK
-      elif fbs == 'b':
-        return Back.BLACK
-    elif color_str == 'RED':
-      if fbs == 'f':
-        return Fore.RED
-      elif fbs == 'b':
-        return Back.RED
-    elif color_str == 'GREEN':
-      if fbs == 'f':
-        return Fore.GREEN
-      elif fbs == 'b':
-        return Back.GREEN
-    elif color_str == 'YELLOW':
-      if fbs == 'f':
-        return Fore.YELLOW
-      elif fbs == 'b':
-        return Back.YELLOW
-    elif color_str == 'BLUE':
-      if fbs == 'f':
-        return Fore.BLUE
-      elif fbs == 'b':
-        return Back.BLUE
-    elif color_str == 'MAGENTA':
-      if fbs == 'f':
-        return Fore.MAGENTA
-      elif fbs == 'b':
-        return Back.MAGENTA
-    elif color_str == 'CYAN':
-      if fbs == 'f':
-        return Fore.CYAN
-      elif fbs == 'b':
-        return Back.CYAN
-    elif color_str == 'WHITE':
-      if fbs == 'f':
-        return Fore.WHITE
-      elif fbs == 'b':
-        return Back.WHITE
-    elif color_str == 'DIM':
-      return Style.DIM
-    elif color_str == 'NORMAL':
-      return Style.NORMAL
-    elif color_str == 'BRIGHT':
-      return Style.BRIGHT
-    else:
-      if fbs == 'f':
-        return Fore.RESET
-      elif fbs == 'b':
-        return Back.RESET
-      elif fbs == 's':
-        return Style.RESET_ALL
+    if color_str in _STYLE:
+      return _STYLE[color_str]
+    if fbs == 'f' and color_str in _FORE:
+      return _FORE[color_str]
+    if fbs == 'b' and color_str in _BACK:
+      return _BACK[color_str]
+    return _RESET.get(fbs)
 
   def banner(self, text1, text2, text3, color1=None, color2=None, color3=None, color=True):
     text_len = len(text2 + text3)
@@ -3,7 +3,29 @@ Entropy tester for passwords!
 """
 
 # LIBRARIES
+import sys
 import math
+import secrets
+import threading
+from collections import OrderedDict
+
+# Largest count table (positions x digit counts x special counts) built for
+# exact counting and uniform sampling; bigger policies fall back to the
+# frame-based generator in pw.py and report no exact entropy
+MAX_TABLE_CELLS = 100_000
+# Every cell holds counts about num_chars * log2(alphabet) bits wide, so the
+# table grows with the square of the length: also cap cells x bits per count
+MAX_TABLE_BITS = 1 << 25
+ALPHABET_BITS = math.log2(95)  # widest count per character: printable ASCII
+
+# counts in reports are written out in chunks of this many decimal digits
+DECIMAL_CHUNK_DIGITS = 1000
+DECIMAL_CHUNK = 10 ** DECIMAL_CHUNK_DIGITS
+
+# Memory budget for the count tables kept between calls (bytes). One table
+# near MAX_TABLE_BITS takes 10-16 MB, so counters are evicted by size, least
+# recently used first, not by number
+COUNTER_CACHE_BUDGET = 64 * 1024 * 1024
 
 
 class Entropy:
@@ -15,3 +37,261 @@ class Entropy:
     # https://crypto.stackexchange.com/questions/374/how-should-i-calculate-the-entropy-of-a-password
     # pass in the password and the number of possible characters for each position
     return password_len * math.log2(alphabet_size)
+
+  def policy_entropy(self, policy):
+    # exact entropy of a compiled pw.PasswordPolicy, see policy_entropy() below
+    return policy_entropy(policy)
+
+
+class PolicyCounter:
+  """
+  Exact count of the passwords a pw.PasswordPolicy allows, by dynamic
+  programming over positions and (capped) digit/special counts.
+
+  A password is valid when it has num_chars characters from the policy
+  alphabet, at least min_digits digits and min_specials specials, letters at
+  both ends if bookended, and (with no_consecutives) no two neighbours that
+  match case-insensitively. Each character is counted once, in one class:
+  digit if it is an allowed digit, else special if it is an allowed special.
+
+  Characters are grouped by their lowercase form (only with no_consecutives,
+  otherwise every character is its own group). Groups whose members look the
+  same to the constraints are interchangeable, so the table only needs one
+  entry per group *type* instead of per character:
+
+    ways[i][d][s][t] = number of ways to fill positions i..n-1 when d digits
+    and s specials (capped at the minimums) are already placed and the
+    previous character belongs to one particular group of type t
+    (t = len(types) means there is no previous character).
+  """
+  def __init__(self, policy):
+    o = policy.options
+    self.num_chars = o.num_chars
+    self.min_digits = o.min_digits
+    self.min_specials = o.min_specials
+    self.bookend = o.bookend
+    self.no_consecutives = o.no_consecutives
+
+    digits = set(policy.alphabet_digits) if o.digits else set()
+    specials = set(policy.alphabet_specials) if o.specials else set()
+    letters = set(policy.user_alphas)
+
+    # GROUPS: fold key -> member characters (each character once)
+    groups = {}
+    for ch in dict.fromkeys(policy.alphabet):
+      key = ch.lower() if self.no_consecutives else ch
+      groups.setdefault(key, []).append(ch)
+
+    # TYPES: a member is (digit?, special?, letter?); a type is the sorted tuple of its members
+    type_index = {}
+    self.types = []  # list of member tuples
+    self.type_groups = []  # list of [member characters per group of that type]
+    self.group_type = {}  # fold key -> type index
+    for key, chars in groups.items():
+      members = sorted(((ch in digits, ch not in digits and ch in specials, ch in letters), ch) for ch in chars)
+      signature = tuple(m for m, _ in members)
+      t = type_index.get(signature)
+      if t is None:
+        t = type_index[signature] = len(self.types)
+        self.types.append(signature)
+        self.type_groups.append([])
+      self.type_groups[t].append(tuple(ch for _, ch in members))
+      self.group_type[key] = t
+    self.type_counts = [len(g) for g in self.type_groups]
+
+    self.ways = self._build_table()
+    self.nbytes = self._estimate_size()
+
+  def _build_table(self):
+    n = self.num_chars
+    md = self.min_digits
+    ms = self.min_specials
+    num_types = len(self.types)
+    start = num_types  # "no previous character"
+    # ways[i][d][s] is a list indexed by previous type (plus the start slot)
+    ways = [None] * (n + 1)
+    done = [[[0] * (num_types + 1) for _ in range(ms + 1)] for _ in range(md + 1)]
+    done[md][ms] = [1] * (num_types + 1)
+    ways[n] = done
+    for i in range(n - 1, -1, -1):
+      letters_only = self.bookend and (i == 0 or i == n - 1)
+      nxt = ways[i + 1]
+      table = [[None] * (ms + 1) for _ in range(md + 1)]
+      for d in range(md + 1):
+        for s in range(ms + 1):
+          # completions if the character at i is in one particular group of type t
+          per_group = []
+          for t, members in enumerate(self.types):
+            total = 0
+            for is_digit, is_special, is_letter in members:
+              if letters_only and not is_letter:
+                continue
+              total += nxt[min(d + is_digit, md)][min(s + is_special, ms)][t]
+            per_group.append(total)
+          all_groups = sum(c * w for c, w in zip(self.type_counts, per_group))
+          row = [all_groups] * (num_types + 1)
+          if self.no_consecutives:
+            # the previous character's own group is off limits
+            for t in range(num_types):
+              row[t] = all_groups - per_group[t]
+          row[start] = all_groups
+          table[d][s] = row
+      ways[i] = table
+    return ways
+
+  def _estimate_size(self):
+    """Rough in-memory footprint of the count table in bytes (lists and ints)."""
+    size = sys.getsizeof(self.ways)
+    for table in self.ways:
+      size += sys.getsizeof(table)
+      for by_specials in table:
+        size += sys.getsizeof(by_specials)
+        for row in by_specials:
+          # rows repeat one int object in most slots: count each object once
+          size += sys.getsizeof(row) + sum(sys.getsizeof(c) for c in {id(c): c for c in row}.values())
+    return size
+
+  def count(self):
+    """Number of valid passwords."""
+    return self.ways[0][0][0][len(self.types)]
+
+  def bits(self):
+    """log2 of the number of valid passwords (0 if none)."""
+    total = self.count()
+    return math.log2(total) if total > 0 else 0.0
+
+  def sample(self, randbelow=secrets.randbelow):
+    """
+    Return one valid password chosen uniformly at random: every password the
+    policy allows is equally likely. Each position picks a (group type,
+    member) weighted by its number of completions, then one concrete group of
+    that type uniformly, so the cost is O(num_chars) with no rejection.
+    """
+    n = self.num_chars
+    md = self.min_digits
+    ms = self.min_specials
+    ways = self.ways
+    types = self.types
+    type_counts = self.type_counts
+    type_groups = self.type_groups
+    d = s = 0
+    prev_t = len(types)  # start: no previous character
+    prev_g = -1
+    chars = []
+    for i in range(n):
+      letters_only = self.bookend and (i == 0 or i == n - 1)
+      nxt = ways[i + 1]
+      r = randbelow(ways[i][d][s][prev_t])
+      for t, members in enumerate(types):
+        same = self.no_consecutives and t == prev_t
+        available = type_counts[t] - same
+        if available <= 0:
+          continue
+        for j, (is_digit, is_special, is_letter) in enumerate(members):
+          if letters_only and not is_letter:
+            continue
+          nd = min(d + is_digit, md)
+          ns = min(s + is_special, ms)
+          w = nxt[nd][ns][t]
+          block = available * w
+          if r < block:
+            g = r // w
+            if same and g >= prev_g:
+              g += 1  # skip the previous character's own group
+            chars.append(type_groups[t][g][j])
+            d, s, prev_t, prev_g = nd, ns, t, g
+            break
+          r -= block
+        else:
+          continue
+        break
+    return ''.join(chars)
+
+
+def exact_counting_supported(options):
+  """True if the count table for these pw.PasswordOptions fits in MAX_TABLE_CELLS and MAX_TABLE_BITS."""
+  cells = options.num_chars * (options.min_digits + 1) * (options.min_specials + 1)
+  return cells <= MAX_TABLE_CELLS and cells * options.num_chars * ALPHABET_BITS <= MAX_TABLE_BITS
+
+
+_counters = OrderedDict()  # policy -> PolicyCounter, least recently used first
+_counters_lock = threading.Lock()
+
+
+def policy_counter(policy):
+  """Memoized PolicyCounter for a compiled policy (they hash by their options), within COUNTER_CACHE_BUDGET."""
+  with _counters_lock:
+    counter = _counters.get(policy)
+    if counter is not None:
+      _counters.move_to_end(policy)
+      return counter
+  # build outside the lock: a large table takes a while and other policies shouldn't wait for it
+  counter = PolicyCounter(policy)
+  with _counters_lock:
+    counter = _counters.setdefault(policy, counter)
+    _counters.move_to_end(policy)
+    used = sum(c.nbytes for c in _counters.values())
+    # the newest counter is always kept, even if it alone exceeds the budget
+    while used > COUNTER_CACHE_BUDGET and len(_counters) > 1:
+      _, dropped = _counters.popitem(last=False)
+      used -= dropped.nbytes
+  return counter
+
+
+def count_passwords(policy):
+  """Exact number of passwords allowed by a compiled pw.PasswordPolicy, or None if the policy is too large to count."""
+  if not exact_counting_supported(policy.options):
+    return None
+  return policy_counter(policy).count()
+
+
+def policy_entropy(policy):
+  """Exact entropy in bits of a uniformly chosen password under *policy*, or None if the policy is too large to count."""
+  if not exact_counting_supported(policy.options):
+    return None
+  return policy_counter(policy).bits()
+
+
+def _decimal(count):
+  # str() refuses ints over sys.get_int_max_str_digits() digits; long policies have counts that big
+  digits = []
+  while count >= DECIMAL_CHUNK:
+    count, low = divmod(count, DECIMAL_CHUNK)
+    digits.append(f"{low:0{DECIMAL_CHUNK_DIGITS}d}")
+  return str(count) + ''.join(reversed(digits))
+
+
+def policy_report(policy):
+  """Machine-readable entropy summary for a compiled pw.PasswordPolicy."""
+  count = count_passwords(policy)
+  naive = policy.options.num_chars * math.log2(len(set(policy.alphabet)))
+  return {
+    "num_chars": policy.options.num_chars,
+    "alphabet_size": len(set(policy.alphabet)),
+    "valid_passwords": None if count is None else _decimal(count),
+    "bits": None if count is None else round(policy_entropy(policy), 4),
+    "naive_bits": round(naive, 4),
+  }
+
+
+def mask_count(policy):
+  """Exact number of passwords a compiled pw.MaskPolicy can produce."""
+  return math.prod(len(p) for p in policy.positions)
+
+
+def mask_entropy(policy):
+  """Exact entropy in bits of a password drawn from a compiled pw.MaskPolicy."""
+  return sum(math.log2(len(p)) for p in policy.positions)
+
+
+def mask_report(policy):
+  """Machine-readable entropy summary for a compiled pw.MaskPolicy."""
+  bits = mask_entropy(policy)
+  return {
+    "num_chars": len(policy.positions),
+    "mask": policy.options.mask,
+    "alphabet_size": len(policy.alphabet),
+    "valid_passwords": _decimal(mask_count(policy)),
+    "bits": round(bits, 4),
+    "naive_bits": round(bits, 4),
+  }
@@ -3,64 +3,600 @@ Submit passphrases and passwords to HaveIBeenPwned using the pwned passwords API
 https://haveibeenpwned.com/API/v3#PwnedPasswords
 """
 # LIBRARIES
+import os
+import time
+import random
+import zlib
+import sqlite3
 import hashlib
+import threading
 import requests
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
-# MODULES
-import os
+# the real Pwned Passwords API; point HIBP elsewhere (e.g. hibp_server.py) with base_url
+DEFAULT_BASE_URL = 'https://api.pwnedpasswords.com'
 
-class HIBP:
+# default cap on concurrent range queries in check_many()
+MAX_WORKERS = 8
+
+# responses worth retrying: rate limited or a temporary server problem
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# network errors worth retrying; any other requests error (a bad URL, too many redirects) fails at once
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ContentDecodingError)
+
+# GENERATE-UNTIL-CLEAN PIPELINE
+CLEAN_CHUNK = 64  # candidates generated and checked per step
+CLEAN_MAX_FAILED_BATCHES = 3  # consecutive chunks whose checks all failed before giving up
+CLEAN_MAX_ATTEMPTS = 10  # candidates generated per wanted result before giving up on a policy that is mostly pwned
+
+# SCHEDULER DEFAULTS
+DEFAULT_RATE = 50.0  # range queries per second, sustained
+DEFAULT_BURST = 50  # queries allowed back to back before the rate applies
+DEFAULT_MAX_DELAY = 30.0  # longest single backoff, seconds
+BREAKER_THRESHOLD = 5  # consecutive queries that failed after all their retries, before the circuit opens
+BREAKER_COOLDOWN = 30.0  # seconds the circuit stays open before one trial query
+
+# ranges with up to this many wanted suffixes are searched directly instead of parsed
+FIND_LIMIT = 16
+
+# RANGE CACHE DEFAULTS
+# kept outside the repo: cached prefixes say something about the passwords you checked
+DEFAULT_CACHE_PATH = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'hwtp' / 'hibp_ranges.sqlite3'
+DEFAULT_CACHE_TTL = 24 * 60 * 60  # seconds
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # compressed bodies
+
+
+def hash_password(password):
+  """Uppercase SHA-1 of *password*, split into (5-character range prefix, 35-character suffix)."""
+  digest = hashlib.sha1(password.encode("UTF-8")).hexdigest().upper()
+  return digest[:5], digest[5:]
+
+
+def parse_range(body):
+  """
+  Parse a raw range response (bytes) into {suffix bytes: count}, once per
+  range so a whole batch can be resolved against it. CRLF and LF line endings
+  are handled alike; padding lines (count 0) are left out.
+  """
+  counts = {}
+  for line in body.split():
+    suffix, _, count = line.partition(b':')
+    if count != b'0':
+      counts[suffix.upper()] = int(count)
+  return counts
+
+
+def find_count(body, suffix):
+  """
+  Count for one suffix (bytes) in a range response, found by searching the
+  bytes directly instead of parsing every line. 0 if absent (or padding).
+  *body* must already be upper case (upper it once per range, not per
+  suffix); *suffix* may be either case, like with parse_range().
+  """
+  needle = suffix.upper() + b':'
+  i = body.find(needle)
+  while i != -1:
+    if i == 0 or body[i - 1] in b'\r\n':
+      start = i + len(needle)
+      end = body.find(b'\n', start)
+      return int(body[start:end if end != -1 else len(body)])
+    i = body.find(needle, i + 1)
+  return 0
+
+
+def range_stats(body):
+  """(total lines, padded lines) of a raw range response, for verbose output."""
+  lines = body.split()
+  return len(lines), sum(1 for line in lines if line.endswith(b':0'))
+
+
+def _pwnage_result(count):
+  # the check_password_pwnage() tuple for one count (None = the range failed)
+  if count is None:
+    return (False, -1)
+  if count > 0:
+    # password was found in a databreach
+    return (True, count)
+  # password not found in any databreaches
+  return (False, 0)
+
+
+class CircuitOpenError(Exception):
+  """Raised instead of querying while too many consecutive queries have failed."""
+
+
+class TokenBucket:
+  """Thread-safe token bucket: acquire() blocks until a query may be sent."""
+  def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+    self.rate = rate
+    self.capacity = max(1, burst)
+    self.tokens = float(self.capacity)
+    self.updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def acquire(self):
+    while True:
+      with self._lock:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        wait = (1 - self.tokens) / self.rate
+      time.sleep(wait)
+
+
+class CircuitBreaker:
+  """
+  Opens after `threshold` consecutive failures so a dead or throttling API
+  fails fast; after `cooldown` seconds one trial query is let through, and
+  its success closes the circuit again.
+  """
+  def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+    self.threshold = threshold
+    self.cooldown = cooldown
+    self.failures = 0
+    self.opened_at = None
+    self._trial = False
+    self._lock = threading.Lock()
+
+  def allow(self):
+    with self._lock:
+      if self.opened_at is None:
+        return True
+      if not self._trial and time.monotonic() - self.opened_at >= self.cooldown:
+        self._trial = True  # half open: exactly one query tests the API
+        return True
+      return False
+
+  def record_success(self):
+    with self._lock:
+      self.failures = 0
+      self.opened_at = None
+      self._trial = False
+
+  def record_failure(self):
+    with self._lock:
+      self.failures += 1
+      if self._trial or self.failures >= self.threshold:
+        self.opened_at = time.monotonic()
+        self._trial = False
+
+  @property
+  def is_open(self):
+    return self.opened_at is not None
+
+
+class BatchReport:
+  """What happened to the range queries of one HIBP.check_many() batch."""
   def __init__(self):
-    self.hibp_url = 'https://api.pwnedpasswords.com/range/'
+    self.queries = 0  # HTTP requests actually sent, retries included
+    self.ranges = 0  # distinct ranges asked of the scheduler
+    self.retried = {}  # prefix -> retries needed
+    self.failed = {}  # prefix -> reason it gave up
+    self.started = time.monotonic()
+    self.seconds = 0.0
+    self._lock = threading.Lock()
+
+  def summary(self):
+    return (f"HIBP batch: {self.ranges} ranges, {self.queries} requests in {self.seconds:.2f}s; "
+            f"{len(self.retried)} ranges retried, {len(self.failed)} failed")
+
+
+class RangeScheduler:
+  """
+  Sends range queries for HIBP under a token bucket rate limit with at most
+  max_in_flight requests outstanding. 429 / 5xx responses and network errors
+  are retried with exponential backoff and full jitter (honouring
+  Retry-After), up to max_retries times; a CircuitBreaker stops a batch from
+  hammering an API that keeps failing.
+  """
+  def __init__(self, fetch, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_in_flight=MAX_WORKERS,
+               max_retries=3, backoff_factor=0.5, max_delay=DEFAULT_MAX_DELAY, breaker=None):
+    self._fetch = fetch
+    self.bucket = TokenBucket(rate, burst)
+    self._in_flight = threading.BoundedSemaphore(max(1, max_in_flight))
+    self.max_retries = max_retries
+    self.backoff_factor = backoff_factor
+    self.max_delay = max_delay
+    self.breaker = breaker or CircuitBreaker()
+
+  def _delay(self, attempt, error):
+    delay = random.uniform(0, min(self.max_delay, self.backoff_factor * 2 ** attempt))
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after is not None:
+      try:
+        delay = max(delay, min(self.max_delay, float(retry_after)))
+      except ValueError:
+        pass  # an HTTP date: keep the jittered delay
+    return delay
+
+  def fetch(self, prefix, report=None):
+    """Fetch one range body, retrying as configured; raises the last error if it gives up."""
+    report = report or BatchReport()
+    with report._lock:
+      report.ranges += 1
+    attempt = 0
+    while True:
+      if not self.breaker.allow():
+        error = CircuitOpenError("too many HIBP queries failed in a row, not sending more for now")
+        with report._lock:
+          report.failed[prefix] = str(error)
+        raise error
+      self.bucket.acquire()
+      with self._in_flight:
+        with report._lock:
+          report.queries += 1
+        try:
+          body = self._fetch(prefix)
+        except requests.RequestException as error:
+          if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            retryable = status is None or status in RETRY_STATUSES
+          else:
+            status = None
+            retryable = isinstance(error, RETRY_ERRORS)
+          if not retryable or attempt >= self.max_retries:
+            self.breaker.record_failure()
+            with report._lock:
+              report.failed[prefix] = f"HTTP {status}" if status else type(error).__name__
+            raise
+          delay = self._delay(attempt + 1, error)
+        else:
+          self.breaker.record_success()
+          return body
+      attempt += 1
+      with report._lock:
+        report.retried[prefix] = attempt
+      time.sleep(delay)
+
+
+class RangeCache:
+  """
+  On-disk cache of HIBP range responses (sqlite3), keyed by the range URL
+  they came from (source) and prefix, so a stand-in server's answers are
+  never served for the real API or another stand-in. Padding
+  lines are dropped and the rest is zlib-compressed before storing. Entries
+  older than ttl seconds count as misses; once the stored bodies grow past
+  max_bytes the least recently used ranges are evicted. Safe to share
+  between the threads of HIBP.check_many().
+  """
+  def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_CACHE_TTL, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    self.path = Path(path)
+    self.ttl = ttl
+    self.max_bytes = max_bytes
+    # hashed prefixes of checked passwords are private: only the owner may read them
+    self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))  # sqlite gives its -wal/-shm files the same mode
+    self._lock = threading.Lock()
+    self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+    self._db.execute('PRAGMA journal_mode=WAL')
+    self._db.execute('PRAGMA synchronous=NORMAL')
+    if self._db.execute('SELECT 1 FROM sqlite_master WHERE name = ?', ('ranges',)).fetchone() and \
+        'source' not in [column[1] for column in self._db.execute('PRAGMA table_info(ranges)')]:
+      self._db.execute('DROP TABLE ranges')  # cached before ranges were keyed by source; refetch
+    self._db.execute('CREATE TABLE IF NOT EXISTS ranges (source TEXT NOT NULL, prefix TEXT NOT NULL, fetched REAL NOT NULL, '
+                     'accessed REAL NOT NULL, body BLOB NOT NULL, PRIMARY KEY (source, prefix))')
+    self._db.commit()
+    self.hits = 0
+    self.misses = 0
+    self.expired = 0
+    # seconds since each hit's range was fetched, as running totals so long sessions use constant memory
+    self.hit_age_total = 0.0
+    self.hit_age_max = None
+
+  def get(self, prefix, source):
+    """Cached range body (bytes) for *prefix* from *source*, or None if missing or expired."""
+    with self._lock:
+      row = self._db.execute('SELECT fetched, body FROM ranges WHERE source = ? AND prefix = ?', (source, prefix)).fetchone()
+      now = time.time()
+      if row is None:
+        self.misses += 1
+        return None
+      fetched, body = row
+      if now - fetched > self.ttl:
+        self.expired += 1
+        self.misses += 1
+        return None
+      with self._db:
+        self._db.execute('UPDATE ranges SET accessed = ? WHERE source = ? AND prefix = ?', (now, source, prefix))
+      self.hits += 1
+      age = now - fetched
+      self.hit_age_total += age
+      self.hit_age_max = age if self.hit_age_max is None else max(self.hit_age_max, age)
+      return zlib.decompress(body)
+
+  def put(self, prefix, body, source):
+    """Store a range response (bytes) freshly fetched from *source*."""
+    compact = b'\n'.join(line for line in body.split() if not line.endswith(b':0'))
+    body = zlib.compress(compact, 9)
+    now = time.time()
+    with self._lock:
+      with self._db:
+        self._db.execute('INSERT OR REPLACE INTO ranges (source, prefix, fetched, accessed, body) VALUES (?, ?, ?, ?, ?)',
+                         (source, prefix, now, now, body))
+        self._evict()
+
+  def _evict(self):
+    # caller holds self._lock inside a transaction
+    total = self._db.execute('SELECT COALESCE(SUM(LENGTH(body)), 0) FROM ranges').fetchone()[0]
+    if total <= self.max_bytes:
+      return
+    for source, prefix, size in self._db.execute('SELECT source, prefix, LENGTH(body) FROM ranges ORDER BY accessed').fetchall():
+      self._db.execute('DELETE FROM ranges WHERE source = ? AND prefix = ?', (source, prefix))
+      total -= size
+      if total <= self.max_bytes:
+        break
+
+  def stats(self):
+    """Hit/miss/expired counters, hit ages (seconds) and what is stored."""
+    with self._lock:
+      entries, stored = self._db.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM ranges').fetchone()
+      return {
+        "hits": self.hits,
+        "misses": self.misses,
+        "expired": self.expired,
+        "mean_hit_age": self.hit_age_total / self.hits if self.hits else None,
+        "max_hit_age": self.hit_age_max,
+        "entries": entries,
+        "bytes": stored,
+        "max_bytes": self.max_bytes,
+        "ttl": self.ttl,
+      }
+
+  def clear(self):
+    with self._lock:
+      with self._db:
+        self._db.execute('DELETE FROM ranges')
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+
+class HIBP:
+  def __init__(self, pool_size=10, retries=3, backoff_factor=0.5, timeout=(15, 60), cache=None, offline=None, prefilter=None,
+               rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_in_flight=MAX_WORKERS, base_url=DEFAULT_BASE_URL):
+    """
+    One persistent requests.Session per HIBP object, so every check in a batch
+    reuses pooled keep-alive connections instead of a new TCP+TLS handshake.
+    Every range query goes through a RangeScheduler.
+    pool_size: connections kept open to the API
+    retries / backoff_factor: retries for network errors and RETRY_STATUSES, with jittered exponential backoff (retries = 0 disables it)
+    rate / burst / max_in_flight: token bucket rate limit (queries per second) and cap on outstanding queries
+    timeout: (connect, read) in seconds
+    base_url: API root serving /range/<prefix>, e.g. a local stand-in from hibp_server.py
+    cache: optional RangeCache consulted before every range query
+    offline: optional hibp_offline.OfflineIndex; when set, every check is answered locally and nothing is sent
+    prefilter: optional hibp_offline.BloomFilter; passwords it rules out are reported clean without asking
+      the offline index or the API, and only its hits are confirmed there
+    """
+    self.hibp_url = f"{base_url.rstrip('/')}/range/"
     self.headers = {'Add-Padding': 'true'}
-    self.timeout = (15, 60)  # (connect, read)
+    self.timeout = timeout  # (connect, read)
+    self.pool_size = pool_size
+    self.cache = cache
+    self.offline = offline
+    self.prefilter = prefilter
+    self.session = self._make_session(pool_size)
+    self.scheduler = RangeScheduler(self.fetch_range, rate=rate, burst=burst, max_in_flight=max_in_flight,
+                                    max_retries=retries, backoff_factor=backoff_factor)
+    self.last_report = None  # BatchReport of the latest check_many() that queried the API
+
+  def _make_session(self, pool_size):
+    # retrying is left to the RangeScheduler, so every retry shows up in the batch report
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session = requests.Session()
+    session.headers.update(self.headers)
+    session.headers['Connection'] = 'keep-alive'
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+  def close(self):
+    # release pooled connections (and the cache database)
+    self.session.close()
+    if self.cache is not None:
+      self.cache.close()
+    if self.offline is not None:
+      self.offline.close()
+    if self.prefilter is not None:
+      self.prefilter.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def fetch_range(self, prefix):
+    """Return the raw (padded) range response body, as bytes, for a 5-character hash prefix."""
+    r = self.session.get(
+      f"{self.hibp_url}{prefix}",
+      timeout=self.timeout
+    )
+    r.raise_for_status()
+    return r.content
+
+  def _range_counts(self, prefix, suffixes, verbose=False, report=None):
+    """
+    Fetch one range (from the cache if possible) and return {suffix: count}
+    for the requested suffixes, or None if something went wrong; failures are
+    recorded in *report*, not printed. A few suffixes are searched for
+    directly in the bytes; more are resolved against one parse of the whole
+    range.
+    """
+    report = report or BatchReport()
+    body = self.cache.get(prefix, self.hibp_url) if self.cache is not None else None
+    if body is None:
+      try:
+        body = self.scheduler.fetch(prefix, report)
+      except Exception as error:
+        with report._lock:
+          report.failed.setdefault(prefix, str(error) or type(error).__name__)
+        return None
+      if self.cache is not None:
+        self.cache.put(prefix, body, self.hibp_url)
+    try:
+      if len(suffixes) <= FIND_LIMIT:
+        body = body.upper()
+        counts = {suffix: find_count(body, suffix.encode('ascii')) for suffix in suffixes}
+      else:
+        parsed = parse_range(body)
+        counts = {suffix: parsed.get(suffix.encode('ascii'), 0) for suffix in suffixes}
+    except Exception as error:
+      with report._lock:
+        report.failed[prefix] = f"unreadable response: {error}"
+      return None
+    if verbose is True:
+      total, padded = range_stats(body)
+      print(f"Total hashes returned from HIBP: {total} (including {padded} padded hashes.)")
+    return counts
 
   def check_password_pwnage(self, password, verbose=False):
     """
-    Returns a tuple (True/False, Int/-1)
+    Returns a tuple (True/False, Int/-1), counts are ints
     True = password has been pwned
     False = password has not been pwned
     Int 1+ = # of times it's been pwned
     Int = -1 = something went wrong
     """
-    # get sha-1 hash of password
-    sha1_hash = hashlib.sha1()
-    sha1_hash.update(password.encode("UTF-8"))
-    hashed_pwd = sha1_hash.hexdigest()
-    first_5 = hashed_pwd[0:5]
-    hash_remainder = hashed_pwd[5:]
+    return self.check_many([password], verbose=verbose)[0]
 
+  def _offline_result(self, prefix, suffix):
     try:
-      self.r = requests.request(
-        "GET", 
-        url=f"{self.hibp_url}{first_5}", 
-        headers=self.headers, 
-        timeout=self.timeout
-      )
+      count = self.offline.lookup(prefix + suffix)
     except Exception as error:
-      print(f"!!! Problem getting data from HIBP: {error}")
-      return (False, -1)
-    
-    try:
-      hibp_hash_list = [line.strip() for line in self.r.text.split(os.linesep)]
-    except Exception as error:
-      print(f"!!! Problem processing data returned from HIBP: {error}")
+      print(f"!!! Problem reading the offline HIBP index: {error}")
       return (False, -1)
+    return _pwnage_result(count)
+
+  def check_many(self, passwords, verbose=False, max_workers=MAX_WORKERS, report=None):
+    """
+    Check a batch of passwords. Every password is hashed first; the prefilter
+    (if any) clears most of them without I/O, and the rest are answered by the
+    offline index or grouped by their 5-character prefix, so each distinct
+    range is fetched (concurrently, at most max_workers at a time and never
+    more than the connection pool holds) and parsed exactly once. Returns a
+    list of check_password_pwnage() tuples in the same order as *passwords*.
+    Range queries are recorded in *report* (a new BatchReport by default),
+    which becomes last_report.
+    """
+    hashed = [hash_password(p) for p in passwords]
+    results = [None] * len(hashed)
+    pending = list(range(len(hashed)))
+    if self.prefilter is not None:
+      pending = [i for i in pending if self.prefilter.might_contain(hashed[i][0] + hashed[i][1])]
+      for i in set(range(len(hashed))) - set(pending):
+        results[i] = (False, 0)
+      if verbose is True and len(hashed) > 1:
+        print(f"Prefilter cleared {len(hashed) - len(pending)} of {len(hashed)} passwords.")
+    if self.offline is not None:
+      for i in pending:
+        results[i] = self._offline_result(*hashed[i])
+      return results
+    groups = {}  # prefix -> distinct suffixes wanted from that range
+    for i in pending:
+      prefix, suffix = hashed[i]
+      groups.setdefault(prefix, {})[suffix] = None
+    prefixes = list(groups)
+    report = report or BatchReport()
+    fetch = lambda prefix: self._range_counts(prefix, list(groups[prefix]), verbose, report)
+    workers = max(1, min(max_workers, self.pool_size, len(prefixes)))
+    if workers == 1:
+      ranges = {prefix: fetch(prefix) for prefix in prefixes}
     else:
-      total_hashes_returned = 0
-      padded_hashes = 0
-      for line in hibp_hash_list:
-        total_hashes_returned += 1
-        next_hash, pwn_count = line.split(':')
-        if pwn_count == '0':
-          # no need to check hash values for padded results
-          padded_hashes += 1
-        elif next_hash.lower() == hash_remainder.lower():
-          # password was found in a databreach
-          return (True, pwn_count)
-      # password not found in any databreaches
-      if verbose is True: print(f"Total hashes returned from HIBP: {total_hashes_returned} (including {padded_hashes} padded hashes.)")
-      return (False, 0)
+      with ThreadPoolExecutor(max_workers=workers) as pool:
+        ranges = dict(zip(prefixes, pool.map(fetch, prefixes)))
+    report.seconds = time.monotonic() - report.started
+    if report.ranges:
+      self.last_report = report
+    if verbose is True and len(pending) > 1:
+      print(f"Checked {len(pending)} passwords with {len(prefixes)} range queries.")
+    for i in pending:
+      prefix, suffix = hashed[i]
+      counts = ranges[prefix]
+      results[i] = _pwnage_result(None if counts is None else counts[suffix])
+    return results
+
+  def generate_clean(self, generate, num_reps, plain=None, verbose=False, chunk=CLEAN_CHUNK):
+    """
+    Generate-until-clean pipeline. Candidates come from generate(n) in chunks
+    and are checked with check_many() on a background thread. Once some have
+    come back pwned, a spare chunk sized by the pwned rate seen so far is
+    checked behind the one in flight, so replacements are usually ready before
+    they are needed; while nothing is pwned, no more is checked than asked for.
+    Pwned candidates (and ones whose check failed) are dropped and replaced
+    until exactly num_reps clean ones are found.
+    plain(candidate) is the text to hash, e.g. color.strip for colorized output.
+    Returns (candidates, results) like check_many(). If checks keep failing,
+    the shortfall is made up with candidates marked (False, -1); if nearly
+    everything comes back pwned (a tiny policy), it stops after
+    CLEAN_MAX_ATTEMPTS candidates per result and returns fewer.
+    """
+    plain = plain or (lambda text: text)
+    max_candidates = max(num_reps * CLEAN_MAX_ATTEMPTS, chunk)
+    clean = []
+    unknown = []  # candidates whose check failed
+    generated = checked = pwned = failed_batches = 0
+    in_flight = deque()
+    report = BatchReport()  # shared by every chunk, so last_report covers the whole pipeline
+    pool = ThreadPoolExecutor(max_workers=2)
+    try:
+      while len(clean) < num_reps:
+        while len(in_flight) < 2 and generated < max_candidates:
+          outstanding = sum(len(b) for b, _ in in_flight)
+          wanted = num_reps - len(clean) - outstanding
+          if wanted <= 0:
+            if not pwned:
+              break
+            # spare chunk: about as many as the outstanding candidates are likely to lose
+            wanted = -(-outstanding * pwned // checked)
+          batch = generate(min(chunk, wanted, max_candidates - generated))
+          in_flight.append((batch, pool.submit(self.check_many, [plain(c) for c in batch], report=report)))
+          generated += len(batch)
+        if not in_flight:
+          break
+        batch, future = in_flight.popleft()
+        results = future.result()
+        checked += len(batch)
+        for candidate, result in zip(batch, results):
+          if result[0] is True:
+            pwned += 1
+          elif result[1] == -1:
+            unknown.append(candidate)
+          elif len(clean) < num_reps:
+            clean.append(candidate)
+        failed_batches = failed_batches + 1 if all(r[1] == -1 for r in results) else 0
+        if failed_batches >= CLEAN_MAX_FAILED_BATCHES:
+          break
+    finally:
+      # let a spare chunk's check finish, so nothing touches report (or last_report) after we return
+      pool.shutdown(wait=True, cancel_futures=True)
+    report.seconds = time.monotonic() - report.started
+    if report.ranges:
+      self.last_report = report
+    results = [(False, 0)] * len(clean)
+    shortfall = num_reps - len(clean)
+    if shortfall > 0 and failed_batches >= CLEAN_MAX_FAILED_BATCHES:
+      print(f"!!! Giving up on HIBP checks after {failed_batches} failed batches; {shortfall} result(s) are unchecked.")
+      extras = unknown[:shortfall]
+      if len(extras) < shortfall:
+        extras += generate(shortfall - len(extras))
+      clean += extras
+      results += [(False, -1)] * shortfall
+    elif shortfall > 0:
+      print(f"!!! Gave up after checking {checked} candidates: {pwned} were pwned and only {len(clean)} of {num_reps} were clean. "
+            "Try a larger policy (more characters or words).")
+    if verbose is True:
+      print(f"Generate-until-clean: checked {checked} candidates, replaced {pwned} pwned and {len(unknown)} unchecked.")
+    return clean, results
 
   def test_password_pwnage(self):
     pwd_list = [
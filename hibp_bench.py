@@ -0,0 +1,108 @@
+"""
+Benchmark pwnage checking against the local stand-in server (hibp_server.py)
+or any other range API. Compares three ways of checking the same passwords:
+  sequential  one check_password_pwnage() call after another
+  concurrent  check_password_pwnage() calls on a thread pool
+  batched     one HIBP.check_many() call (deduplicated by prefix, concurrent)
+and reports throughput plus p50/p99 latency of the range requests.
+
+  python hibp_bench.py -n 2000 --latency 40
+  python hibp_bench.py -n 500 --url http://127.0.0.1:8787
+"""
+# LIBRARIES
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# MODULES
+import hibp
+import hibp_server
+import pw
+
+
+def percentile(values, pct):
+  if not values:
+    return 0.0
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def timed_client(url, workers):
+  """HIBP client (no rate limit) whose range requests record their latency."""
+  client = hibp.HIBP(base_url=url, pool_size=workers, rate=1e9, burst=1_000_000, max_in_flight=workers)
+  latencies = []
+  fetch = client.fetch_range
+
+  def timed_fetch(prefix):
+    start = time.perf_counter()
+    try:
+      return fetch(prefix)
+    finally:
+      latencies.append(time.perf_counter() - start)
+
+  client.scheduler._fetch = timed_fetch
+  return client, latencies
+
+
+def run_mode(mode, url, passwords, workers):
+  client, latencies = timed_client(url, workers)
+  start = time.perf_counter()
+  if mode == 'sequential':
+    results = [client.check_password_pwnage(p) for p in passwords]
+  elif mode == 'concurrent':
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+      results = list(pool.map(client.check_password_pwnage, passwords))
+  else:
+    results = client.check_many(passwords, max_workers=workers)
+  seconds = time.perf_counter() - start
+  client.close()
+  return {
+    "mode": mode,
+    "passwords": len(passwords),
+    "requests": len(latencies),
+    "seconds": seconds,
+    "throughput": len(passwords) / seconds if seconds else float('inf'),
+    "p50_ms": percentile(latencies, 50) * 1000,
+    "p99_ms": percentile(latencies, 99) * 1000,
+    "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    "errors": sum(1 for r in results if r[1] == -1),
+    "pwned": sum(1 for r in results if r[0]),
+  }
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Benchmark sequential, concurrent and prefix-batched pwnage checks.")
+  parser.add_argument('-n', '--num', type=int, default=1000, help='Passwords to check (default: 1000)')
+  parser.add_argument('--repeat', type=float, default=0.0,
+                      help='Fraction of the passwords that are repeats of earlier ones, to exercise prefix deduplication (default: 0)')
+  parser.add_argument('--workers', type=int, default=hibp.MAX_WORKERS, help=f'Concurrent requests (default: {hibp.MAX_WORKERS})')
+  parser.add_argument('--url', type=str, default=None, help='Benchmark this range API instead of starting a local stand-in')
+  parser.add_argument('--latency', type=float, default=20.0, help='Stand-in latency per response, milliseconds (default: 20)')
+  parser.add_argument('--jitter', type=float, default=5.0, help='Stand-in latency jitter, milliseconds (default: 5)')
+  parser.add_argument('--synthetic', type=int, default=100_000, help='Hashes in the stand-in synthetic set (default: 100000)')
+  parser.add_argument('--modes', nargs='+', default=['sequential', 'concurrent', 'batched'],
+                      choices=['sequential', 'concurrent', 'batched'], help='Modes to run (default: all)')
+  args = parser.parse_args()
+
+  server = None
+  url = args.url
+  if url is None:
+    server = hibp_server.start_server(hibp_server.synthetic_hashes(args.synthetic, seed=1),
+                                      latency=args.latency / 1000, jitter=args.jitter / 1000)
+    url = f"http://127.0.0.1:{server.server_port}"
+    print(f"Local stand-in on {url} ({args.latency:g} +/- {args.jitter:g} ms per response)")
+
+  unique = max(1, int(args.num * (1 - args.repeat)))
+  passwords = pw.password().compile(num_chars=16).generate(unique)
+  passwords += [passwords[i % unique] for i in range(args.num - unique)]
+  passwords += list(hibp_server.KNOWN_PASSWORDS)
+
+  print(f"{'mode':<11} {'passwords':>9} {'requests':>8} {'seconds':>8} {'pw/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'pwned':>5} {'errors':>6}")
+  for mode in args.modes:
+    r = run_mode(mode, url, passwords, args.workers)
+    print(f"{r['mode']:<11} {r['passwords']:>9} {r['requests']:>8} {r['seconds']:>8.2f} {r['throughput']:>9.1f} "
+          f"{r['p50_ms']:>7.1f} {r['p99_ms']:>7.1f} {r['pwned']:>5} {r['errors']:>6}")
+
+  if server is not None:
+    server.shutdown()
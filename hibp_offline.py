@@ -0,0 +1,246 @@
+"""
+Offline HaveIBeenPwned lookups from a locally downloaded Pwned Passwords SHA-1
+file (one "HASH:COUNT" line per hash, sorted by hash). build_index() turns the
+text file into a compact binary index once; OfflineIndex memory-maps it and
+answers each lookup with a binary search inside one prefix bucket, so no
+network access is needed.
+
+Index layout (all integers little-endian):
+  header   MAGIC, record count (uint64)
+  table    PREFIX_BUCKETS + 1 uint64 record offsets, one bucket per 5-hex-digit prefix
+  records  20-byte SHA-1 digest + uint32 count, sorted by digest
+
+For screening many candidates, build_filter() makes a Bloom filter a fraction
+of the index size. BloomFilter answers "definitely not pwned" or "maybe", and
+only the maybes need confirming against the index or the API.
+
+Filter layout (little-endian):
+  header   FILTER_MAGIC, bits (uint64), hashes (uint64), items (uint64)
+  bits     the bit array
+"""
+# LIBRARIES
+import math
+import mmap
+import struct
+import tempfile
+import shutil
+from pathlib import Path
+
+MAGIC = b'HWTPIDX1'
+HEADER = struct.Struct('<8sQ')
+PREFIX_BUCKETS = 1 << 20  # 16 ** 5
+TABLE_SIZE = (PREFIX_BUCKETS + 1) * 8
+RECORD = struct.Struct('<20sI')
+DIGEST_SIZE = 20
+
+FILTER_MAGIC = b'HWTPBLM1'
+FILTER_HEADER = struct.Struct('<8sQQQ')
+DEFAULT_FP_RATE = 0.01
+
+
+class OfflineIndexError(ValueError):
+  """Raised when a Pwned Passwords file or index is malformed."""
+
+
+def _read_digests(source):
+  # SHA-1 digests from either a HASH:COUNT text file or an index built by build_index()
+  with source.open('rb') as f:
+    is_index = f.read(len(MAGIC)) == MAGIC
+  if is_index:
+    with OfflineIndex(source) as index:
+      mm = index._mm
+      for offset in range(index._records, len(mm), RECORD.size):
+        yield mm[offset:offset + DIGEST_SIZE]
+    return
+  with source.open('rb') as lines:
+    for line_no, line in enumerate(lines, 1):
+      line = line.strip()
+      if not line:
+        continue
+      try:
+        digest = bytes.fromhex(line.split(b':')[0].decode('ascii'))
+      except ValueError:
+        raise OfflineIndexError(f"Line {line_no} of {source} is not a HASH:COUNT line: {line[:60]!r}")
+      if len(digest) != DIGEST_SIZE:
+        raise OfflineIndexError(f"Line {line_no} of {source} does not hold a SHA-1 hash.")
+      yield digest
+
+
+def _bloom_positions(digest, num_bits, num_hashes):
+  # the digest is already uniformly distributed: split it into two 64-bit halves for double hashing
+  h1 = int.from_bytes(digest[:8], 'little')
+  h2 = int.from_bytes(digest[8:16], 'little') | 1
+  return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+
+def build_filter(source, destination, fp_rate=DEFAULT_FP_RATE, verbose=False):
+  """
+  Build a Bloom filter at *destination* from a Pwned Passwords HASH:COUNT
+  file or an offline index, sized for the requested false positive rate
+  (0.01 costs about 1.2 bytes per hash: about 1.1 GB for the full dump of
+  roughly 930 million hashes). The whole filter is built in memory, so its
+  size is printed before it is allocated. Returns the number of hashes added.
+  """
+  source = Path(source)
+  destination = Path(destination)
+  if not 0 < fp_rate < 1:
+    raise OfflineIndexError(f"The false positive rate must be between 0 and 1, not {fp_rate}.")
+  items = sum(1 for _ in _read_digests(source))
+  num_bits = max(64, math.ceil(-items * math.log(fp_rate) / math.log(2) ** 2))
+  num_bits = (num_bits + 7) // 8 * 8
+  num_hashes = max(1, min(32, round(num_bits / max(items, 1) * math.log(2))))
+  print(f"Sizing the filter for {items:,} hashes: {num_bits // 8 / 1024 / 1024:.1f} MiB in memory and on disk, {num_hashes} hashes per item.")
+  bits = bytearray(num_bits // 8)
+  for n, digest in enumerate(_read_digests(source), 1):
+    for pos in _bloom_positions(digest, num_bits, num_hashes):
+      bits[pos >> 3] |= 1 << (pos & 7)
+    if verbose and n % 10_000_000 == 0:
+      print(f"Added {n:,} hashes...")
+  destination.parent.mkdir(parents=True, exist_ok=True)
+  with destination.open('wb') as out:
+    out.write(FILTER_HEADER.pack(FILTER_MAGIC, num_bits, num_hashes, items))
+    out.write(bits)
+  if verbose:
+    print(f"Added {items:,} hashes from {source} to {destination}.")
+  return items
+
+
+def build_index(source, destination, verbose=False):
+  """
+  Build a binary index at *destination* from a sorted "HASH:COUNT" text file.
+  Returns the number of hashes indexed.
+  """
+  source = Path(source)
+  destination = Path(destination)
+  counts = [0] * PREFIX_BUCKETS
+  total = 0
+  previous = b''
+  with tempfile.TemporaryFile() as records, source.open('rb') as lines:
+    pack = RECORD.pack
+    for line_no, line in enumerate(lines, 1):
+      line = line.strip()
+      if not line:
+        continue
+      try:
+        hex_hash, count = line.split(b':')
+        digest = bytes.fromhex(hex_hash.decode('ascii'))
+        count = int(count)
+      except ValueError:
+        raise OfflineIndexError(f"Line {line_no} of {source} is not a HASH:COUNT line: {line[:60]!r}")
+      if len(digest) != DIGEST_SIZE:
+        raise OfflineIndexError(f"Line {line_no} of {source} does not hold a SHA-1 hash.")
+      if digest <= previous:
+        raise OfflineIndexError(f"{source} is not sorted by hash (line {line_no}). Download the file ordered by hash.")
+      previous = digest
+      records.write(pack(digest, min(count, 0xFFFFFFFF)))
+      counts[int.from_bytes(digest[:3], 'big') >> 4] += 1
+      total += 1
+      if verbose and total % 10_000_000 == 0:
+        print(f"Indexed {total:,} hashes...")
+
+    # prefix table: offsets[p] = index of the first record whose prefix is >= p
+    offsets = bytearray(TABLE_SIZE)
+    running = 0
+    for p in range(PREFIX_BUCKETS):
+      struct.pack_into('<Q', offsets, p * 8, running)
+      running += counts[p]
+    struct.pack_into('<Q', offsets, PREFIX_BUCKETS * 8, running)
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    records.seek(0)
+    with destination.open('wb') as out:
+      out.write(HEADER.pack(MAGIC, total))
+      out.write(offsets)
+      shutil.copyfileobj(records, out, 16 * 1024 * 1024)
+  if verbose:
+    print(f"Indexed {total:,} hashes from {source} into {destination}.")
+  return total
+
+
+class OfflineIndex:
+  """
+  Memory-mapped index built by build_index(). lookup() costs one table read
+  and a binary search over the (typically ~1000) records sharing the prefix.
+  """
+  def __init__(self, path):
+    self.path = Path(path)
+    self._file = self.path.open('rb')
+    try:
+      self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      self._file.close()
+      raise OfflineIndexError(f"{self.path} is empty, not an offline HIBP index.")
+    magic, self.size = HEADER.unpack_from(self._mm, 0) if len(self._mm) >= HEADER.size else (b'', 0)
+    if magic != MAGIC or len(self._mm) != HEADER.size + TABLE_SIZE + self.size * RECORD.size:
+      self.close()
+      raise OfflineIndexError(f"{self.path} is not an offline HIBP index (build one with: hwtp.py utils build-index).")
+    self._records = HEADER.size + TABLE_SIZE
+
+  def lookup(self, sha1_hex):
+    """Breach count for a 40-character SHA-1 hex digest (0 = not pwned)."""
+    digest = bytes.fromhex(sha1_hex)
+    mm = self._mm
+    bucket = int(sha1_hex[:5], 16)
+    lo, hi = struct.unpack_from('<QQ', mm, HEADER.size + bucket * 8)
+    base = self._records
+    size = RECORD.size
+    while lo < hi:
+      mid = (lo + hi) // 2
+      offset = base + mid * size
+      key = mm[offset:offset + DIGEST_SIZE]
+      if key < digest:
+        lo = mid + 1
+      elif key > digest:
+        hi = mid
+      else:
+        return RECORD.unpack_from(mm, offset)[1]
+    return 0
+
+  def close(self):
+    self._mm.close()
+    self._file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+class BloomFilter:
+  """
+  Memory-mapped filter built by build_filter(). might_contain() is False for
+  a hash that is definitely not in the source file, and True for a hash that
+  is (or, at the configured false positive rate, is not).
+  """
+  def __init__(self, path):
+    self.path = Path(path)
+    self._file = self.path.open('rb')
+    try:
+      self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      self._file.close()
+      raise OfflineIndexError(f"{self.path} is empty, not a HIBP filter.")
+    header = FILTER_HEADER.unpack_from(self._mm, 0) if len(self._mm) >= FILTER_HEADER.size else (b'', 0, 0, 0)
+    magic, self.num_bits, self.num_hashes, self.items = header
+    if magic != FILTER_MAGIC or len(self._mm) != FILTER_HEADER.size + self.num_bits // 8:
+      self.close()
+      raise OfflineIndexError(f"{self.path} is not a HIBP filter (build one with: hwtp.py utils build-filter).")
+
+  def might_contain(self, sha1_hex):
+    mm = self._mm
+    base = FILTER_HEADER.size
+    for pos in _bloom_positions(bytes.fromhex(sha1_hex), self.num_bits, self.num_hashes):
+      if not mm[base + (pos >> 3)] & (1 << (pos & 7)):
+        return False
+    return True
+
+  def close(self):
+    self._mm.close()
+    self._file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
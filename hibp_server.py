@@ -0,0 +1,118 @@
+"""
+Local stand-in for the Pwned Passwords range API, for testing and
+benchmarking pwnage checks without the real service. Serves
+GET /range/<prefix> from a synthetic hash set (or a provided HASH:COUNT
+file), pads responses like the real API when asked to with the Add-Padding
+header, and can add a fixed latency (plus jitter) to every response.
+
+Run it and point HWTP at it:
+  python hibp_server.py --port 8787 --latency 40
+  python hwtp.py pp -n 20 -pwn --hibp-url http://127.0.0.1:8787
+"""
+# LIBRARIES
+import time
+import random
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# always present in the synthetic set, so checks have something to find
+KNOWN_PASSWORDS = {'password': 9545824, '123456': 37359195, 'chicken1': 3737, 'pokemon1': 16063}
+
+# padded responses hold a random number of lines in this range, like the real API
+PADDED_LINES = (800, 1000)
+
+
+def synthetic_hashes(count, seed=None):
+  """{prefix: [b'SUFFIX:COUNT', ...]} for *count* random hashes plus KNOWN_PASSWORDS."""
+  rng = random.Random(seed)
+  ranges = {}
+  for password, pwned in KNOWN_PASSWORDS.items():
+    digest = hashlib.sha1(password.encode('UTF-8')).hexdigest().upper()
+    ranges.setdefault(digest[:5], []).append(f"{digest[5:]}:{pwned}".encode('ascii'))
+  for _ in range(count):
+    digest = '%040X' % rng.getrandbits(160)
+    ranges.setdefault(digest[:5], []).append(f"{digest[5:]}:{rng.randint(1, 500)}".encode('ascii'))
+  return ranges
+
+
+def load_hashes(path):
+  """{prefix: [b'SUFFIX:COUNT', ...]} from a Pwned Passwords HASH:COUNT file."""
+  ranges = {}
+  with Path(path).open('rb') as lines:
+    for line in lines:
+      line = line.strip()
+      if line:
+        ranges.setdefault(line[:5].decode('ascii').upper(), []).append(line[5:].upper())
+  return ranges
+
+
+def make_handler(ranges, latency=0.0, jitter=0.0):
+  """Request handler class serving *ranges* with latency +/- jitter seconds."""
+  # padding lines are drawn from a pool made once, so padding costs next to nothing per request
+  padding_pool = [b'%035X:0' % random.getrandbits(140) for _ in range(PADDED_LINES[1] * 4)]
+
+  class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out separately; don't stall on delayed ACKs
+
+    def do_GET(self):
+      parts = self.path.rstrip('/').split('/')
+      prefix = parts[-1].upper()
+      if len(parts) < 2 or parts[-2] != 'range' or len(prefix) != 5 or any(c not in '0123456789ABCDEF' for c in prefix):
+        self._send(400, b'The hash prefix was not in a valid format')
+        return
+      lines = list(ranges.get(prefix, ()))
+      if self.headers.get('Add-Padding', '').lower() == 'true':
+        target = random.randint(*PADDED_LINES)
+        lines += random.sample(padding_pool, max(0, target - len(lines)))
+        random.shuffle(lines)
+      if latency or jitter:
+        time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+      self._send(200, b'\r\n'.join(lines))
+
+    def _send(self, status, body):
+      self.send_response(status)
+      self.send_header('Content-Type', 'text/plain')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, format, *args):
+      pass  # quiet: benchmarks send thousands of requests
+
+  return RangeHandler
+
+
+def start_server(ranges, host='127.0.0.1', port=0, latency=0.0, jitter=0.0):
+  """
+  Start a stand-in server on a background thread and return it; its base URL
+  is f"http://{host}:{server.server_port}". Call server.shutdown() to stop it.
+  """
+  server = ThreadingHTTPServer((host, port), make_handler(ranges, latency, jitter))
+  server.daemon_threads = True
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Local stand-in for the Pwned Passwords range API.")
+  parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+  parser.add_argument('--port', type=int, default=8787, help='Port to listen on (default: 8787)')
+  parser.add_argument('--latency', type=float, default=0.0, help='Milliseconds added to every response (default: 0)')
+  parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- milliseconds on top of --latency (default: 0)')
+  parser.add_argument('--hashes', type=str, default=None, help='Serve this HASH:COUNT file instead of a synthetic set')
+  parser.add_argument('--synthetic', type=int, default=100_000, help='Number of random hashes in the synthetic set (default: 100000)')
+  parser.add_argument('--seed', type=int, default=None, help='Seed for the synthetic set')
+  args = parser.parse_args()
+
+  ranges = load_hashes(args.hashes) if args.hashes else synthetic_hashes(args.synthetic, args.seed)
+  server = ThreadingHTTPServer((args.host, args.port), make_handler(ranges, args.latency / 1000, args.jitter / 1000))
+  server.daemon_threads = True
+  print(f"Serving {sum(len(v) for v in ranges.values()):,} hashes on http://{args.host}:{server.server_port} (Ctrl+C to stop)")
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
@@ -7,7 +7,11 @@ import cli  # command line interface
 import pp  # passphrase generator
 import pw  # password generator
 import hibp  # check passwords for known breached
+import hibp_offline  # offline pwnage index
+import wiki  # Wikipedia titles for -w
 import pp_utils  # passphrase utilities
+import color as color_codes  # strip color codes before pwnage checks
+import json
 from pathlib import Path
 import sys
 
@@ -113,6 +117,29 @@ if __name__ == '__main__':
                     verbose=verbose,
                 )
 
+        elif utils_type == 'build-index':
+            try:
+                hibp_offline.build_index(cli.get_arg('input'), cli.get_arg('output'), verbose=cli.get_arg('verbose'))
+            except (OSError, hibp_offline.OfflineIndexError) as error:
+                print(error)
+                exit(1)
+
+        elif utils_type == 'build-titles':
+            try:
+                wiki.build_title_corpus(cli.get_arg('input'), cli.get_arg('output'),
+                                        max_length=cli.get_arg('max_length'), verbose=cli.get_arg('verbose'))
+            except (OSError, wiki.TitleCorpusError) as error:
+                print(error)
+                exit(1)
+
+        elif utils_type == 'build-filter':
+            try:
+                hibp_offline.build_filter(cli.get_arg('input'), cli.get_arg('output'),
+                                          fp_rate=cli.get_arg('fp_rate'), verbose=cli.get_arg('verbose'))
+            except (OSError, hibp_offline.OfflineIndexError) as error:
+                print(error)
+                exit(1)
+
         elif utils_type == 'process-all':
             lang_name = cli.get_arg('name')
             verbose = cli.get_arg('verbose')
@@ -146,7 +173,23 @@ if __name__ == '__main__':
 
         exit()
 
-    h = hibp.HIBP()  # HIBP object
+    # HIBP object, with an on-disk range cache, an offline index or a prefilter if asked for
+    hibp_cache = cli.get_arg('hibp_cache')
+    offline_path = cli.get_arg('offline')
+    prefilter_path = cli.get_arg('prefilter')
+    offline_index = None
+    prefilter = None
+    try:
+        if offline_path is not None:
+            offline_index = hibp_offline.OfflineIndex(offline_path)
+        if prefilter_path is not None:
+            prefilter = hibp_offline.BloomFilter(prefilter_path)
+    except (OSError, hibp_offline.OfflineIndexError) as error:
+        print(error)
+        exit(1)
+    h = hibp.HIBP(cache=hibp.RangeCache(ttl=hibp_cache * 3600) if hibp_cache is not None else None,
+                  offline=offline_index, prefilter=prefilter,
+                  base_url=cli.get_arg('hibp_url') or hibp.DEFAULT_BASE_URL)
     
     # these five command line arguments are the same for both pp and pw
     if ptype == 'pp' or ptype == 'pw':
@@ -155,11 +198,14 @@ if __name__ == '__main__':
         verbose = cli.get_arg('verbose')
         color = cli.get_arg('color')
         pwn = cli.get_arg('pwn')
+        clean = cli.get_arg('clean')
+        pwn = pwn or clean
 
     if ptype == 'pwn':
         # submit the password to HaveIBeenPwned
         password = cli.get_arg('password')
         pwn = True
+        clean = False
         verbose = True
         return_list = [password]
     elif ptype == 'pp':
@@ -177,16 +223,28 @@ if __name__ == '__main__':
                 dictionary = Path(dictionary).stem
         start_n = cli.get_arg('start_n')
         end_n = cli.get_arg('end_n')
-        pp_gen = pp.passphrase(
-            verbose=verbose,
-            colorize=color,
-            dictionary=dictionary,
-            start_n=start_n,
-            end_n=end_n,
-        )
+        try:
+            pp_gen = pp.passphrase(
+                verbose=verbose,
+                colorize=color,
+                dictionary=dictionary,
+                start_n=start_n,
+                end_n=end_n,
+                title_corpus=cli.get_arg('wiki_corpus') if cli.get_arg('wikipedia') else None,
+            )
+        except pp.DictionaryNotFoundError as error:
+            print(f"[ERROR] {error}")
+            pp_utils.print_cached_dictionaries(numbered=True)
+            exit(1)
+        except (OSError, wiki.TitleCorpusError) as error:
+            print(error)
+            exit(1)
 
         num_words = cli.get_arg('numwords')
-        wiki = cli.get_arg('wikipedia')
+        use_wiki = cli.get_arg('wikipedia')
+        if use_wiki and pp_gen.title_corpus is None:
+            # one-shot run: refill on demand only, never on a thread the exit would cut short
+            pp_gen.title_pool = wiki.TitlePool(background=False)
         augenbaumize = cli.get_arg('augenbaumize')
         pad = cli.get_arg('pad')
         if pad is not False:
@@ -209,7 +267,7 @@ if __name__ == '__main__':
         if verbose is True:
             consec_str = f"You asked for {num_reps} passphrase(s) of {num_chars} chars each"
 
-            if wiki is True:
+            if use_wiki is True:
                 consec_str += ", using Wikipedia as the source"
 
             if augenbaumize is not False:
@@ -221,22 +279,31 @@ if __name__ == '__main__':
             consec_str += "."
             print(consec_str)
 
-        if wiki is True:
-            return_list = pp_gen.generate_passphrase_wikipedia(
-                num_reps=num_reps,
-                colorize=color,
-                augenbaumize=augenbaumize,
-                num_titles=3,
-                verbose=verbose)
+        if use_wiki is True:
+            def generate(n):
+                try:
+                    return pp_gen.generate_passphrase_wikipedia(
+                        num_reps=n,
+                        colorize=color,
+                        augenbaumize=augenbaumize,
+                        num_titles=3,
+                        verbose=verbose,
+                        num_chars=num_chars)
+                except pp.PassphraseError as error:
+                    print(error)
+                    exit(1)
         else:
-            return_list = pp_gen.get_passphrase(num_chars=num_chars,
-                                            num_reps=num_reps,
-                                            num_words=num_words,
-                                            verbose=verbose,
-                                            augenbaumize=augenbaumize,
-                                            pad=pad)
+            try:
+                pp_compiled = pp_gen.compile(num_chars=num_chars,
+                                             num_words=num_words,
+                                             augenbaumize=augenbaumize,
+                                             pad=pad)
+                generate = pp_compiled.generate
+            except pp.PassphraseError as error:
+                print(error)
+                exit(1)
     elif ptype == 'pw':
-        pw = pw.password()  # password object
+        pw_gen = pw.password()  # password object
 
         no_consecutives = cli.get_arg(
             'noconsec'
@@ -250,6 +317,7 @@ if __name__ == '__main__':
         bookend = cli.get_arg('bookend')
         specials_override = cli.get_arg('specialsoverride')
         specials_deny = cli.get_arg('specialsdeny')
+        mask = cli.get_arg('mask')
 
         # process the suppress list
         suppress = cli.get_arg('no')
@@ -258,7 +326,9 @@ if __name__ == '__main__':
         digits = False if 'd' in suppress else True
         specials = False if 's' in suppress else True
 
-        if verbose:
+        if verbose and mask != str():
+            print(f"You asked for {num_reps} password(s) matching the mask {mask}.")
+        elif verbose:
             consec_str = f"You asked for {num_reps}x{num_chars}-character password(s) with a minimum of {min_digits} digits and {min_specials} special characters"
             if ambiguous is True:
                 consec_str += ", with no ambiguous characters (l, I, 1, 0, O)"
@@ -288,29 +358,64 @@ if __name__ == '__main__':
             consec_str += "."
             print(consec_str)
 
-        return_list = pw.get_password(num_reps=num_reps,
-                                      num_chars=num_chars,
-                                      verbose=verbose,
-                                      colorize=color,
-                                      min_digits=min_digits,
-                                      min_specials=min_specials,
-                                      uppercase=uppercase,
-                                      lowercase=lowercase,
-                                      digits=digits,
-                                      specials=specials,
-                                      extra_shuffle=xtra,
-                                      no_consecutives=no_consecutives,
-                                      ambiguous=ambiguous,
-                                      bookend=bookend,
-                                      suppress=suppress,
-                                      specials_override=specials_override,
-                                      specials_deny=specials_deny)
+        try:
+            pw_compiled = pw_gen.compile(pw.PasswordOptions(num_chars=num_chars,
+                                                            colorize=color,
+                                                            min_digits=min_digits,
+                                                            min_specials=min_specials,
+                                                            uppercase=uppercase,
+                                                            lowercase=lowercase,
+                                                            digits=digits,
+                                                            specials=specials,
+                                                            extra_shuffle=xtra,
+                                                            no_consecutives=no_consecutives,
+                                                            ambiguous=ambiguous,
+                                                            bookend=bookend,
+                                                            specials_override=specials_override,
+                                                            specials_deny=specials_deny,
+                                                            mask=mask),
+                                         verbose=verbose)
+        except pw.PasswordError as error:
+            print(error)
+            exit(1)
+
+        if cli.get_arg('entropy_json'):
+            print(json.dumps(pw_compiled.entropy_report()))
+            exit()
+
+        if verbose:
+            pw_gen.print_entropy(pw_compiled)
+
+        generate = pw_compiled.generate
+
+    # check the whole batch at once (concurrently); hash the plain text, not the color codes
+    if clean is True:
+        # check while generating and replace pwned candidates until num_reps clean ones are found
+        return_list, pwn_results = h.generate_clean(generate, num_reps, plain=color_codes.strip, verbose=verbose)
+    elif ptype != 'pwn':
+        return_list = generate(num_reps)
+    if pwn is True and clean is False:
+        pwn_results = h.check_many([color_codes.strip(n) for n in return_list], verbose=verbose)
+    if pwn is True:
+        report = h.last_report
+        if verbose and report is not None:
+            print(report.summary())
+            for prefix, reason in report.failed.items():
+                print(f"  range {prefix} failed: {reason}")
+        elif report is not None and report.failed:
+            # one line for the whole batch; -v lists every failed range
+            reason = next(iter(report.failed.values()))
+            print(f"!!! Problem getting data from HIBP: {len(report.failed)} of {report.ranges} range queries failed ({reason}).")
+        if verbose and h.cache is not None:
+            s = h.cache.stats()
+            ages = f", hit age mean {s['mean_hit_age'] / 60:.1f} min / max {s['max_hit_age'] / 60:.1f} min" if s['hits'] else ""
+            print(f"HIBP cache: {s['hits']} hits, {s['misses']} misses ({s['expired']} expired){ages}; {s['entries']} ranges stored in {s['bytes'] / 1024:.1f} KiB")
 
     # generate return string & print results
     return_string = str()
-    for n in return_list:
+    for i, n in enumerate(return_list):
         if pwn is True:
-            pwd_tuple = h.check_password_pwnage(n, verbose=verbose)
+            pwd_tuple = pwn_results[i]
             if pwd_tuple[0] is True:
                 pwn_str = f" - Pwned! This password has been found in databreaches {pwd_tuple[1]} times."
             else:
@@ -318,7 +423,7 @@ if __name__ == '__main__':
                     pwn_str = "Error getting data back from HaveIBeenPwned - please try again later, status of this password is unknown at this time."
                 else:
                     pwn_str = " - OK! This password has not been found in any databreaches."
-            return_string += n + pwn_str
+            return_string += n + pwn_str + "\n"
         else:
             return_string += n + "\n"
 
@@ -4,59 +4,82 @@ Passphrase generator module.
 """
 
 # Standard library imports
-import re
 import secrets
 import requests
-from typing import List
+from dataclasses import dataclass
+from typing import List, Tuple, Union
 
 # Local application imports
 import entropy
 import color
+import wiki
 from pp_utils import (
     CACHE_DIR,
-    json_read as jr,  # JSON Read
-    print_cached_dictionaries,
-    dictionary_exists,
     create_jit_partition,
+    safe_capitalize,
 )
+from registry import DictionaryRegistry, default_registry
+
+class PassphraseError(ValueError):
+    """Raised when passphrase parameters are invalid or cannot be satisfied."""
+
+
+class DictionaryNotFoundError(PassphraseError):
+    """Raised when a dictionary has no processed data in the cache."""
+
+
+@dataclass(frozen=True)
+class PassphraseOptions:
+    """
+    Immutable per-request passphrase options. Instances are hashable and safe
+    to share between threads.
+    """
+    num_chars: int = 20
+    num_words: Union[int, bool] = False
+    augenbaumize: Union[str, bool] = False
+    pad: Union[Tuple[str, int], bool] = False
+    colorize: bool = False
+
 
 class passphrase:
     def __init__(self, verbose: bool = False, colorize: bool = False,
                  dictionary: str | None = None,
                  start_n: int | None = None,
-                 end_n: int | None = None):
+                 end_n: int | None = None,
+                 registry: DictionaryRegistry | None = None,
+                 title_corpus: str | None = None):
         self.verbose = verbose
         self.color = colorize
         self.default_dictionary = "eff_large_wordlist"
         self.dictionary = dictionary or self.default_dictionary
         self.start_n = start_n
         self.end_n = end_n
+        self.registry = registry or default_registry
 
         self.data_file = CACHE_DIR / f"{self.dictionary}_data.json"
 
-        if not dictionary_exists(self.dictionary):
-            print(f"[ERROR] Required dictionary files for '{self.dictionary}' not found.")
-            print_cached_dictionaries(numbered=True)
-            exit(1)
-
         # instantiate crypto‐secure RNG
         self._crypto = secrets.SystemRandom()
         
-        # LOAD DICTIONARY DATA
-        data = jr(self.data_file.name, convert_keys=False)
-        self.metadata = data.get("metadata", {}) if isinstance(data, dict) else {}
-        wl = data.get("wordlengths", {}) if isinstance(data, dict) else {}
-        self.wordlength_dict = {int(k): v for k, v in wl.items()}
-        # WORDLIST rebuilt from wordlength_dict
-        self.wordlist = [w for words in self.wordlength_dict.values() for w in words]
+        # LOAD DICTIONARY DATA (shared with other passphrase objects via the registry)
+        try:
+            data = self.registry.get(self.dictionary)
+        except FileNotFoundError as e:
+            raise DictionaryNotFoundError(str(e)) from None
+        self.metadata = data.metadata
+        self.wordlength_dict = data.wordlength_dict
+        self.wordlist = data.wordlist
+        self.capitalized_dict = data.capitalized_dict
+        self.capitalized_wordlist = data.capitalized_wordlist
         self.wordlist_length = len(self.wordlist)
         if self.verbose:
             print(f"Loaded {self.wordlist_length} words from {self.dictionary}")
-        self.min_word_length = self.metadata.get("min_word_length", min(self.wordlength_dict))
-        self.max_word_length = self.metadata.get("max_word_length", max(self.wordlength_dict))
-        self.min_chars = self.metadata.get("min_chars", 10)
+        self.min_word_length = data.min_word_length
+        self.max_word_length = data.max_word_length
+        self.min_chars = data.min_chars
         if self.verbose:
             print(f"Imported dictionary data: {self.data_file}")
+            print(f"  Parsed in {data.load_seconds * 1000:.1f} ms, approx. {data.nbytes // 1024} KiB in memory")
             keys = sorted(self.wordlength_dict.keys())
             keys.sort()
             out = ", ".join(str(k) for k in keys)
@@ -68,94 +91,102 @@ class passphrase:
         self.start_n = self.start_n if self.start_n is not None else self.min_word_length * 2
         self.end_n = self.end_n if self.end_n is not None else self.max_word_length * 5
         # PARTITIONS DICT
-        self.partitions_dict = {}
-        if self.metadata.get("has_partitions"):
-            p = data.get("partitions", {})
-            self.partitions_dict = {int(k): v for k, v in p.items()}
-            if self.verbose:
-                print(
-                    "Imported partitions dictionary from embedded data"
-                )
-                print(
-                    f"  Possible partition keys found: {len(self.partitions_dict)}"
-                )
-                keys = list(sorted(int(k) for k in self.partitions_dict.keys()))
-                print(f"  Available partition keys: {keys}")
+        self.partitions_dict = data.partitions_dict
+        if self.partitions_dict and self.verbose:
+            print(
+                "Imported partitions dictionary from embedded data"
+            )
+            print(
+                f"  Possible partition keys found: {len(self.partitions_dict)}"
+            )
+            keys = list(sorted(int(k) for k in self.partitions_dict.keys()))
+            print(f"  Available partition keys: {keys}")
         
+        # WIKIPEDIA TITLES: the online pool is created on first use; an offline corpus replaces it
+        self.title_pool = None
+        self.title_corpus = wiki.TitleCorpus(title_corpus) if title_corpus else None
+
         # COLOR and ENTROPY OBJECTS
         self.c = color.Color()
         self.e = entropy.Entropy()
 
-    def get_passphrase(self, num_chars=20, num_reps=1, num_words=False, verbose=False, augenbaumize=False, pad=False):
-        # ERROR CHECKING FOR INPUTS
-        if not isinstance(num_chars, int):
-            print(f"Invalid type for num_chars: {num_chars}. Must be an integer between {self.min_chars} and 100.")
-            exit(1)
-        if num_chars < self.min_chars or num_chars > 100:
-            print(f"Invalid number of passphrase chars entered: {num_chars}. Must be between {self.min_chars} and 100.")
-            exit(1)
-        if num_words is not False and not isinstance(num_words, int):
-            print(f"Invalid type for num_words: {num_words}. Must be an integer.")
-            exit(1)
-        
-        # COMPREHENSIVE VALIDATION: Check for conflicting parameter combinations
-        self._validate_passphrase_parameters(num_chars, num_words)
+    def compile(self, options: PassphraseOptions | None = None, **kwargs) -> "PassphraseGenerator":
+        """
+        Validate the options once and return a reusable PassphraseGenerator.
+        Pass a PassphraseOptions, or its fields as keyword arguments.
+        Raises PassphraseError if the options cannot be satisfied.
+        """
+        if options is None:
+            kwargs.setdefault("colorize", self.color)
+            if kwargs.get("pad"):
+                kwargs["pad"] = tuple(kwargs["pad"])
+            options = PassphraseOptions(**kwargs)
+        return PassphraseGenerator(self, options)
 
-        self.num_chars = num_chars
-        self.num_reps = num_reps
-        self.num_words = num_words
-        self.verbose = verbose
-        self.augenbaumize = augenbaumize
-        self.pad = pad
+    def generate(self, options: PassphraseOptions, num_reps: int = 1) -> List[str]:
+        """
+        Return *num_reps* passphrases for one request. The loaded dictionary is
+        only read, so one passphrase object can serve many threads.
+        """
+        return self.compile(options).generate(num_reps)
 
-        # GENERATE PASSPHRASE LIST
-        return self.generate_passphrase_list()
+    def get_passphrase(self, num_chars=20, num_reps=1, num_words=False, verbose=False, augenbaumize=False, pad=False):
+        return self.compile(
+            num_chars=num_chars,
+            num_words=num_words,
+            augenbaumize=augenbaumize,
+            pad=pad,
+        ).generate(num_reps)
 
-    def generate_passphrase_list(self):
+    def generate_passphrase_list(self, num_reps: int, options: PassphraseOptions,
+                                 partitions=None) -> List[str]:
+        """
+        Build *num_reps* passphrases from already validated options.
+        ``partitions`` is the precomputed partition list for
+        ``options.num_chars``, or None to use the just-in-time partition algorithm.
+        All working state is local to this call.
+        """
+        num_chars = options.num_chars
+        num_words = options.num_words
+        capitalized = self.capitalized_dict
         result = []
-        for _ in range(self.num_reps):
+        for _ in range(num_reps):
             # Determine frame based on fixed words or character count
-            if self.num_words is not False:
+            if num_words is not False:
                 # FIXED NUMBER OF WORDS
-                frame = [w.capitalize() for w in self.get_random_words_from_list(self.num_words)]
+                frame = self.get_random_words_from_list(num_words)
             else:
                 # FIXED NUMBER OF CHARACTERS
-                partitions = self.partitions_dict.get(self.num_chars)
                 if partitions is None:
                     try:
                         rand_part = create_jit_partition(
-                        self.num_chars,
-                        self.min_word_length,
-                        self.max_word_length,
+                            num_chars,
+                            self.min_word_length,
+                            self.max_word_length,
                         )
                     except ValueError as e:
-                        print(f"[ERROR] {e}")
-                        exit(1)
+                        raise PassphraseError(str(e)) from None
                 else:
-                    rand_part = self._crypto.choice(partitions)
+                    # copy before shuffling: the partition lists are shared
+                    rand_part = list(self._crypto.choice(partitions))
                     self._crypto.shuffle(rand_part)
 
                 frame = []
                 used = set()
+                choice = self._crypto.choice
                 for length in rand_part:
-                    try:
-                        candidates = self.wordlength_dict[length]
-                    except KeyError:
-                        print(
-                            f"[ERROR] Dictionary lacks words of length {length}."
-                        )
-                        exit(1)
-                    word = self.get_random_word_of_length(length)
+                    candidates = capitalized[length]
+                    word = choice(candidates)
                     attempts = len(candidates)
                     while word in used and attempts > 0:
-                        word = self.get_random_word_of_length(length)
+                        word = choice(candidates)
                         attempts -= 1
                     used.add(word)
                     frame.append(word)
 
             # PAD
-            if self.pad:
-                pad_str, pad_pos = self.pad
+            if options.pad:
+                pad_str, pad_pos = options.pad
                 if pad_pos == 1:
                     frame.insert(0, pad_str)
                 elif pad_pos == 2:
@@ -165,65 +196,68 @@ class passphrase:
                     frame.append(pad_str)
 
             # AUGENBAUMIZE
-            if self.augenbaumize:
-                aug = self.augenbaumize
+            if options.augenbaumize:
+                aug = options.augenbaumize
                 frame = [aug] + frame + [aug[::-1]]
 
             # BUILD PASSPHRASE
             phrase = ''.join(frame)
-            
+
             # COLORIZE
-            if self.color:
+            if options.colorize:
                 phrase = self.colorize_passphrase(phrase)
-            
+
             result.append(phrase)
 
         return result
 
     def get_random_word_of_length(self, length):
-        words = self.wordlength_dict.get(length)
+        words = self.capitalized_dict.get(length)
         if not words:
             raise KeyError(length)
-        return self.safe_capitalize(self._crypto.choice(words))
+        return self._crypto.choice(words)
 
     def colorize_passphrase(self, text):
-        colored = ''
-        for ch in text:
-            if ch.isalpha():
-                colored += self.c.p(ch, 'red' if ch.isupper() else 'blue')
-            elif ch.isnumeric():
-                colored += self.c.p(ch, 'green')
-            else:
-                colored += self.c.p(ch, 'magenta')
-        colored += self.c.p('')
-        return colored
-
-    def generate_passphrase_wikipedia(self, num_titles=3, num_reps=1, colorize=False, augenbaumize=False, verbose=False, timeout=5):
-        session = requests.Session()
-        session.headers.update({
-        "User-Agent": "Halt! What's the Passphrase? 1.0 Contact [unicornoverloaded@gmail.com]",
-        "Accept": "application/json",
-    })
-        url = "https://en.wikipedia.org/w/api.php"
-        params = {
-            "action": "query",
-            "format": "json",
-            "list": "random",
-            "rnnamespace": "0",
-            "rnlimit": str(num_titles * num_reps),
-        }
-        try:
-            response = session.get(url=url, params=params, timeout=timeout)
-            response.raise_for_status()
-        except requests.RequestException as exc:
-            print(f"Failed to fetch titles from Wikipedia: {exc}")
-            return []
-        titles = [item["title"] for item in response.json()["query"]["random"]]
-        chunks = list(self.chunker(titles, num_titles))
-        if self.verbose:
-            for chunk in chunks:
-                print(f"TITLE : {chunk}")
-        pp_frame = [self.de_wikify(' '.join(chunk)) for chunk in chunks]
+        return self.c.colorize(text)
+
+    def generate_passphrase_wikipedia(self, num_titles=3, num_reps=1, colorize=False, augenbaumize=False, verbose=False, timeout=5,
+                                      num_chars=None):
+        """
+        Passphrases of *num_titles* random Wikipedia article titles each, taken
+        from the local title pool (see wiki.TitlePool) so titles are never reused
+        and the API is only asked when the pool runs low. Returns exactly
+        *num_reps* passphrases, or [] if Wikipedia cannot supply enough titles.
+        With an offline title corpus, titles are sampled locally instead and
+        *num_chars* (if given) is the exact length of the joined titles.
+        """
+        if self.title_corpus is not None:
+            # titles in the corpus are already cleaned
+            try:
+                chunks = self.title_corpus.sample(num_titles, num_reps, num_chars=num_chars)
+            except wiki.TitleCorpusError as exc:
+                raise PassphraseError(str(exc)) from None
+            if self.verbose:
+                for chunk in chunks:
+                    print(f"TITLE : {chunk}")
+            pp_frame = [''.join(chunk) for chunk in chunks]
+        else:
+            if self.title_pool is None:
+                self.title_pool = wiki.TitlePool(timeout=timeout)
+            pool = self.title_pool
+            held = len(pool)
+            try:
+                titles = pool.take(num_titles * num_reps)
+            except (requests.RequestException, wiki.WikipediaError, ValueError, KeyError) as exc:
+                print(f"Failed to fetch titles from Wikipedia: {exc}")
+                return []
+            if self.verbose:
+                print(f"Took {len(titles)} titles from the pool at {pool.path} ({held} held, {pool.fetched} fetched from Wikipedia)")
+            # take() returns exactly num_titles * num_reps titles, so every chunk is full
+            chunks = list(self.chunker(titles, num_titles))
+            if self.verbose:
+                for chunk in chunks:
+                    print(f"TITLE : {chunk}")
+            pp_frame = [self.de_wikify(' '.join(chunk)) for chunk in chunks]
 
         if augenbaumize:
             pp_frame = [augenbaumize + w + augenbaumize[::-1] for w in pp_frame]
@@ -238,60 +272,94 @@ class passphrase:
     def de_wikify(self, text):
         if self.verbose:
             print(f"START : {text}")
-        text = re.sub(r"[\(\[].*?[\)\]]", "", text).strip()
-        text = text.replace('-', ' ')
-        words = text.split()
-        cleaned = ''
-        for word in words:
-            for idx, ch in enumerate(word):
-                if ch.isalnum():
-                    cleaned += ch.upper() if idx == 0 else ch
+        cleaned = wiki.de_wikify(text)
         if self.verbose:
             print(f"CLEAN : {cleaned}")
         return cleaned
     
     def get_random_words_from_list(self, num_words: int) -> List[str]:
         """
-        Return *num_words* random words without duplicates, using self.wordlength_dict
+        Return *num_words* random words without duplicates, capitalized with str.capitalize(), using self.capitalized_wordlist
         """
-        pool = [w for sub in self.wordlength_dict.values() for w in sub]
+        pool = self.capitalized_wordlist
         if num_words > len(pool):
-            print(f"Requested {num_words} words, but only {len(pool)} available.")
-            exit(1)
-        chosen = set()
-        result = []
-        while len(result) < num_words:
-            w = self._crypto.choice(pool)
-            if w not in chosen:
-                chosen.add(w)
-                result.append(self.safe_capitalize(w))
-        return result
+            raise PassphraseError(f"Requested {num_words} words, but only {len(pool)} available.")
+        return self._crypto.sample(pool, num_words)
 
     def safe_capitalize(self, word: str) -> str:
         """Capitalize first ASCII alphabetic character"""
-        return (word[0].upper() + word[1:]) if word[:1].isalpha() and word[:1].isascii() else word
+        return safe_capitalize(word)
 
     def _validate_passphrase_parameters(self, num_chars, num_words):
         """Comprehensive validation of passphrase generation parameters to catch conflicting combinations."""
-        
+
+        if not isinstance(num_chars, int) or isinstance(num_chars, bool):
+            raise PassphraseError(f"Invalid type for num_chars: {num_chars}. Must be an integer between {self.min_chars} and 100.")
+        if num_words is not False and (not isinstance(num_words, int) or isinstance(num_words, bool)):
+            raise PassphraseError(f"Invalid type for num_words: {num_words}. Must be an integer.")
+
         # Check if num_words exceeds available words in dictionary
         if num_words is not False:
             if num_words <= 0:
-                print(f"Invalid number of words: {num_words}. Must be a positive integer.")
-                exit(1)
-            
+                raise PassphraseError(f"Invalid number of words: {num_words}. Must be a positive integer.")
+
             # Get total available words
             total_words = len(self.wordlist)
             if num_words > total_words:
-                print(f"Requested {num_words} words, but only {total_words} available in dictionary '{self.dictionary}'. Your passphrase is: hack3r. Exiting.")
-                exit(1)
-        
+                raise PassphraseError(f"Requested {num_words} words, but only {total_words} available in dictionary '{self.dictionary}'. Your passphrase is: hack3r. Exiting.")
+
         # Check if num_chars is too small for reasonable passphrase generation
         if num_chars < self.min_chars:
-            print(f"Requested {num_chars} characters, but minimum passphrase length is {self.min_chars} characters. Your passphrase is: hack3r. Exiting.")
-            exit(1)
-        
+            raise PassphraseError(f"Requested {num_chars} characters, but minimum passphrase length is {self.min_chars} characters. Your passphrase is: hack3r. Exiting.")
+
         # Check if num_chars is too large for reasonable passphrase generation
         if num_chars > 100:
-            print(f"Requested {num_chars} characters, but maximum passphrase length is 100 characters. Your passphrase is: hack3r. Exiting.")
-            exit(1)
+            raise PassphraseError(f"Requested {num_chars} characters, but maximum passphrase length is 100 characters. Your passphrase is: hack3r. Exiting.")
+
+
+class PassphraseGenerator:
+    """
+    A passphrase generator compiled from a loaded dictionary and one
+    PassphraseOptions. All validation happens here, once; generate() only
+    draws words and never prints or exits.
+    """
+    def __init__(self, source: passphrase, options: PassphraseOptions):
+        source._validate_passphrase_parameters(options.num_chars, options.num_words)
+        pad = options.pad
+        if pad:
+            try:
+                pad_str, pad_pos = pad
+            except (TypeError, ValueError):
+                raise PassphraseError(f"-pad arguments invalid: {pad}. Expected a string and a position.") from None
+            if not isinstance(pad_str, str) or pad_pos not in (1, 2, 3):
+                raise PassphraseError(
+                    f"-pad position invalid: {pad_pos}. Pad position must be either 1 (beginning), 2 (middle), or 3 (end)."
+                )
+        if options.augenbaumize is not False and not isinstance(options.augenbaumize, str):
+            raise PassphraseError(f"Invalid Augenbaum string: {options.augenbaumize}. Must be a string.")
+
+        self.source = source
+        self.options = options
+
+        # PARTITIONS: resolve the precomputed list (or prove JIT is possible) up front
+        self.partitions = None
+        if options.num_words is False:
+            num_chars = options.num_chars
+            self.partitions = source.partitions_dict.get(num_chars)
+            if self.partitions is None:
+                lengths = set(range(source.min_word_length, source.max_word_length + 1))
+                try:
+                    create_jit_partition(num_chars, source.min_word_length, source.max_word_length)
+                except ValueError as e:
+                    raise PassphraseError(str(e)) from None
+            else:
+                lengths = {n for part in self.partitions for n in part}
+            missing = sorted(n for n in lengths if not source.wordlength_dict.get(n))
+            if missing:
+                raise PassphraseError(
+                    f"Dictionary lacks words of length {', '.join(str(n) for n in missing)}."
+                )
+
+    def generate(self, n: int = 1) -> List[str]:
+        """Return *n* passphrases."""
+        return self.source.generate_passphrase_list(n, self.options, partitions=self.partitions)
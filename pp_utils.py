@@ -386,6 +386,10 @@ def filter_word_list(word_list: List[str],
 #         print(f"Couldn't write file: {dictionary_name_out} Error: {error}")
 #         return False
 
+def safe_capitalize(word: str) -> str:
+    """Capitalize first ASCII alphabetic character"""
+    return (word[0].upper() + word[1:]) if word[:1].isalpha() and word[:1].isascii() else word
+
 def generate_wordlength_dict(word_list: List[str]) -> Dict[int, List[str]]:
     try:
         return {length: [w for w in word_list if len(w) == length] for length in set(map(len, word_list))}
@@ -5,15 +5,59 @@ Read about the difference between the secrets and random modules in Python's sta
 https://docs.python.org/3/library/secrets.html
 """
 # LIBRARIES
-import random
+import os
 import secrets
 import string
-from typing import List
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple
 
 # MODULES
 import entropy
 import color
 
+# OPTIONAL: NumPy speeds up bulk generation; everything works without it
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+
+# CHARACTER SETS
+AMBIGUOUS_CHARACTERS = frozenset('l1IO0')
+PUNCTUATION = frozenset(string.punctuation)
+
+# batches at least this big use the NumPy bulk engine when it is installed
+BULK_THRESHOLD = 256
+
+
+class PasswordError(ValueError):
+  """Raised when password parameters are invalid or conflict with each other."""
+
+
+@dataclass(frozen=True)
+class PasswordOptions:
+  """
+  Immutable per-request password options. Instances are hashable and safe to
+  share between threads.
+  """
+  uppercase: bool = True
+  lowercase: bool = True
+  digits: bool = True
+  min_digits: int = 0
+  specials: bool = True
+  min_specials: int = 0
+  specials_override: str = str()
+  specials_deny: str = str()
+  no_consecutives: bool = False
+  extra_shuffle: bool = False
+  ambiguous: bool = False
+  bookend: bool = False
+  colorize: bool = False
+  num_chars: int = 20
+  mask: str = str()  # e.g. '?u?l?l?l-?d?d?d?d-?s', see compile_mask()
+
 
 class password:
   def __init__(self):
@@ -23,6 +67,26 @@ class password:
     # ENTROPY TESTER OBJECT
     self.e = entropy.Entropy()
 
+  def compile(self, options: PasswordOptions | None = None, verbose=False, **kwargs) -> "PasswordGenerator":
+    """
+    Validate the options once and return a reusable PasswordGenerator.
+    Pass a PasswordOptions, or its fields as keyword arguments.
+    Raises PasswordError if the options conflict.
+    """
+    if options is None:
+      kwargs.pop('suppress', None)  # informational only, see get_password()
+      options = PasswordOptions(**kwargs)
+    if options.mask != str():
+      return MaskGenerator(options, verbose=verbose, color_obj=self.c)
+    return PasswordGenerator(options, verbose=verbose, color_obj=self.c)
+
+  def generate(self, options: PasswordOptions, num_reps=1) -> List[str]:
+    """
+    Return *num_reps* passwords for one request. No state is kept on the
+    instance, so a single password object can serve many threads.
+    """
+    return self.compile(options).generate(num_reps)
+
   def get_password(self, uppercase=True, lowercase=True, digits=True, min_digits=0,
                    specials=True, min_specials=0, specials_override=str(),
                    specials_deny=str(), suppress=list(), no_consecutives=False,
@@ -36,322 +100,592 @@ class password:
      * ambiguous: don't use chars 'l', '1', 'I', 'O', '0'
      * bookend: upper- and lowercase letters only at start and end of password
     """
-    self.use_uppercase = uppercase
-    self.use_lowercase = lowercase
-    self.use_digits = digits
-    self.min_digits = min_digits
-    self.use_specials = specials
-    self.min_specials = min_specials
-    self.specials_override = str(specials_override)  # just in case
-    self.specials_deny = str(specials_deny)  # just in case
-    self.no_consecutives = no_consecutives
-    self.extra_shuffle = extra_shuffle
-    self.num_chars = num_chars
-    self.num_reps = num_reps
-    self.remove_ambiguous = ambiguous
-    self.bookend = bookend
-    self.suppress = suppress
-    self.color = colorize
-    self.verbose = verbose
-
-    self.ambiguous_characters = ['l', '1', 'I', 'O', '0']
-
-    # ERROR CHECK: ARGUMENTS FROM CLI
-    # min_digits + min_specials cannot be greater than the total number of chars asked for in the password
-    if self.min_digits + self.min_specials > self.num_chars:
-      print(f"You've asked for a {self.num_chars}-character password with {self.min_digits} digits and {self.min_specials} special characters. {self.min_digits} + {self.min_specials} = {self.min_digits + self.min_specials} which is greater than {self.num_chars}. Your password is: password. Exiting.")
-      exit(1)
-
-    # specials_override string cannot be longer than 100 characters
-    if len(self.specials_override) >= 100:
-      print(f"You've tried to add a list of special characters that is {len(self.specials_override)} characters long. That's just too many characters (100 is the maximum). Your password is: hack3r. Exiting.")
-      exit(1)
-
-    # COMPREHENSIVE VALIDATION: Check for conflicting parameter combinations
-    self._validate_password_parameters()
-
-    # CREATE UPPER, LOWER, DIGITS ALPHABETS
-    # create the uppercase, lowercase, and digits alphabets (strings of usable characters by class) that can be used to generate passwords from system defaults
-    self.alphabet_uppercase = string.ascii_uppercase
-    self.alphabet_lowercase = string.ascii_lowercase
-    self.alphabet_digits = string.digits
-
-    # CREATE SPECIALS ALPHABET
-    # the specials alphabet includes all sytem default punctuation, but the user can remove items from the default specials list, or override it entirely
-    if self.specials_override != str():  # not an empty string
-      self.specials_override = self.specials_override.replace(' ', '') # error check
-      self.specials_override = ''.join(set(self.specials_override))  # error check
-      self.specials_list = list(self.specials_override)
-    else:
-      self.specials_list = [x for x in string.punctuation]
-  
-    if self.specials_deny != str():  # not an empty string
-      # try to remove anything in self.specials_deny list from self.specials_list
-      for i in self.specials_deny:
-        try:
-          self.specials_list.remove(i)
-        except ValueError:
-          pass
-
-    self.alphabet_specials = ''.join(self.specials_list)
-
-    # REMOVE AMBIGUOUS
-    # remove anything in self.ambiguous_characters from all alphabets if requested
-    if self.remove_ambiguous is True:
-      self.alphabet_uppercase = ''.join([x for x in self.alphabet_uppercase if x not in self.ambiguous_characters])
-      self.alphabet_lowercase = ''.join([x for x in self.alphabet_lowercase if x not in self.ambiguous_characters])
-      self.alphabet_digits = ''.join([x for x in self.alphabet_digits if x not in self.ambiguous_characters])
-      self.alphabet_specials = ''.join([x for x in self.alphabet_specials if x not in self.ambiguous_characters])
-
-    # CREATE USER DEFINED ALPHABETS
-    # create self.alphabet, a string of all allowable characters that can be used to construct the password if there are no other conditions
-    self.alphabet = ""
-
-    # create self.user_alphas, a string of all allowable non-special and non-digit characters, used if the bookend option is invoked to prevent a password from beginning or ending with digits or special characters
-    self.user_alphas = ""  # could be all uppercase, all lowercase, both, or none (empty string)
-
-    if self.use_uppercase:
-      self.alphabet += self.alphabet_uppercase
-      self.user_alphas += self.alphabet_uppercase
-
-    if self.use_lowercase:
-      self.alphabet += self.alphabet_lowercase
-      self.user_alphas += self.alphabet_lowercase
-
-    if self.use_digits:
-      self.alphabet += self.alphabet_digits
-
-    if self.use_specials:
-      self.alphabet += self.alphabet_specials
-
-    # ERROR CHECK: ALPHABETS
-    # check to make sure self.alphabet is not an empty string!
-    if self.alphabet == str():
-      print("You've asked for a password but have disallowed all possible characters. Very clever! Your password is: n0thingness. Exiting.")
-      exit(1)
-
-    # you can't bookend without any actual letters
-    if self.bookend is True and self.user_alphas == str():
-      print("You've asked for a bookended password that doesn't start with digits or special characters, but disallowed upper and lowercase letters as well. Your password is: n1c3try. Exiting.")
-      exit(1)
+    options = PasswordOptions(uppercase=uppercase, lowercase=lowercase, digits=digits,
+                              min_digits=min_digits, specials=specials,
+                              min_specials=min_specials, specials_override=str(specials_override),
+                              specials_deny=str(specials_deny),
+                              no_consecutives=no_consecutives, extra_shuffle=extra_shuffle,
+                              ambiguous=ambiguous, bookend=bookend, colorize=colorize,
+                              num_chars=num_chars)
+    generator = self.compile(options, verbose=verbose)
 
     # ENTROPY TESTER
-    if self.verbose is True:
-      self.entropy_val = self.e.test_entropy(self.num_chars, len(self.alphabet))
-      print(f"Entropy for all passwords of length {self.num_chars} with {len(self.alphabet)} possible values per character = {round(self.entropy_val)}")
+    if verbose is True:
+      self.print_entropy(generator)
 
     # GENERATE PASSWORD LIST
-    self.password_list = self.generate_password_list()
-    
-    return self.password_list
+    return generator.generate(num_reps)
+
+  def print_entropy(self, generator):
+    """Print the naive per-character entropy and the exact entropy of the generator's policy."""
+    num_chars = generator.num_chars
+    alphabet_size = len(set(generator.alphabet))
+    entropy_val = self.e.test_entropy(num_chars, alphabet_size)
+    print(f"Entropy for all passwords of length {num_chars} with {alphabet_size} possible values per character = {round(entropy_val)}")
+    exact = generator.exact_entropy()
+    if exact is None:
+      print("Exact entropy not computed: this policy is too large to count")
+    else:
+      print(f"Exact entropy counting only passwords that meet every requirement = {exact:.2f} bits")
+
+
+@dataclass(frozen=True)
+class PasswordPolicy:
+  """
+  The validated, compiled form of a PasswordOptions: immutable alphabets and
+  lookup tables. Equality and hashing only look at the options, so compiled
+  policies can be cached and shared between threads. Build one with
+  compile_policy().
+  Tags used by the lookup tables: 'L' bookend letters, 'D' min_digits,
+  'S' min_specials, 'A' any allowed character.
+  """
+  options: PasswordOptions
+  alphabet_uppercase: str = field(compare=False)
+  alphabet_lowercase: str = field(compare=False)
+  alphabet_digits: str = field(compare=False)
+  alphabet_specials: str = field(compare=False)
+  alphabet: str = field(compare=False)  # every allowed character
+  user_alphas: str = field(compare=False)  # allowed letters, used for bookends
+  # tag -> alphabet
+  tag_alphabets: Mapping[str, str] = field(compare=False)
+  # tag -> {lowercased character: indices of its upper/lower forms in that tag's alphabet}
+  fold_index: Mapping[str, Mapping[str, Tuple[int, ...]]] = field(compare=False)
+  # tag -> the only lowercased character in that tag's alphabet, or None
+  single_group: Mapping[Optional[str], Optional[str]] = field(compare=False)
+
+
+@lru_cache(maxsize=256)
+def compile_policy(options: PasswordOptions) -> PasswordPolicy:
+  """
+  Validate *options* and build its PasswordPolicy. Results are cached per
+  options value, so repeated requests under the same policy skip all setup.
+  Raises PasswordError if the options conflict.
+  """
+  o = options
+  specials_override = str(o.specials_override)  # just in case
+  specials_deny = str(o.specials_deny)  # just in case
+
+  # ERROR CHECK: ARGUMENTS FROM CLI
+  # num_chars and the minimums must be sensible integers
+  if not isinstance(o.num_chars, int) or o.num_chars < 1:
+    raise PasswordError(f"Invalid number of password chars entered: {o.num_chars}. Must be a positive integer. Your password is: hack3r. Exiting.")
+  if o.min_digits < 0 or o.min_specials < 0:
+    raise PasswordError(f"Minimum digits ({o.min_digits}) and minimum specials ({o.min_specials}) cannot be negative. Your password is: hack3r. Exiting.")
+
+  # min_digits + min_specials cannot be greater than the total number of chars asked for in the password
+  if o.min_digits + o.min_specials > o.num_chars:
+    raise PasswordError(f"You've asked for a {o.num_chars}-character password with {o.min_digits} digits and {o.min_specials} special characters. {o.min_digits} + {o.min_specials} = {o.min_digits + o.min_specials} which is greater than {o.num_chars}. Your password is: password. Exiting.")
+
+  # specials_override string cannot be longer than 100 characters
+  if len(specials_override) >= 100:
+    raise PasswordError(f"You've tried to add a list of special characters that is {len(specials_override)} characters long. That's just too many characters (100 is the maximum). Your password is: hack3r. Exiting.")
+
+  # COMPREHENSIVE VALIDATION: Check for conflicting parameter combinations
+  _validate_password_parameters(o, specials_override, specials_deny)
+
+  # CREATE UPPER, LOWER, DIGITS ALPHABETS
+  alphabet_uppercase = string.ascii_uppercase
+  alphabet_lowercase = string.ascii_lowercase
+  alphabet_digits = string.digits
+
+  # CREATE SPECIALS ALPHABET
+  alphabet_specials = _specials_alphabet(specials_override, specials_deny)
+
+  # REMOVE AMBIGUOUS
+  # remove anything in AMBIGUOUS_CHARACTERS from all alphabets if requested
+  if o.ambiguous is True:
+    alphabet_uppercase = _drop_ambiguous(alphabet_uppercase)
+    alphabet_lowercase = _drop_ambiguous(alphabet_lowercase)
+    alphabet_digits = _drop_ambiguous(alphabet_digits)
+    alphabet_specials = _drop_ambiguous(alphabet_specials)
+
+  # CREATE USER DEFINED ALPHABETS
+  # alphabet: all allowable characters; user_alphas: all allowable letters (for bookends)
+  user_alphas = (alphabet_uppercase if o.uppercase else '') + (alphabet_lowercase if o.lowercase else '')
+  alphabet = user_alphas + (alphabet_digits if o.digits else '') + (alphabet_specials if o.specials else '')
+
+  # ERROR CHECK: ALPHABETS
+  # check to make sure alphabet is not an empty string!
+  if alphabet == str():
+    raise PasswordError("You've asked for a password but have disallowed all possible characters. Very clever! Your password is: n0thingness. Exiting.")
+
+  # you can't bookend without any actual letters
+  if o.bookend is True and user_alphas == str():
+    raise PasswordError("You've asked for a bookended password that doesn't start with digits or special characters, but disallowed upper and lowercase letters as well. Your password is: n1c3try. Exiting.")
+
+  # bookends take up the first and last characters, leaving less room for min_digits and min_specials
+  if o.bookend is True and o.min_digits + o.min_specials > max(o.num_chars - 2, 0):
+    raise PasswordError(f"You've asked for a bookended {o.num_chars}-character password with {o.min_digits} digits and {o.min_specials} special characters, but the bookends leave room for only {max(o.num_chars - 2, 0)}. Your password is: n1c3try. Exiting.")
+
+  # the minimums need something to draw from after deny lists and the ambiguous filter
+  if o.min_specials > 0 and alphabet_specials == str():
+    raise PasswordError(f"You've asked for {o.min_specials} special characters but no special characters are left to choose from. Your password is: hack3r. Exiting.")
+
+  # LOOKUP TABLES
+  tag_alphabets = {'L': user_alphas, 'D': alphabet_digits, 'S': alphabet_specials, 'A': alphabet}
+  fold_index = {}
+  single_group = {None: None}
+  for tag, tag_alphabet in tag_alphabets.items():
+    index = {}
+    for i, ch in enumerate(tag_alphabet):
+      index.setdefault(ch.lower(), []).append(i)
+    fold_index[tag] = MappingProxyType({k: tuple(v) for k, v in index.items()})
+    single_group[tag] = next(iter(index)) if len(index) == 1 else None
+
+  policy = PasswordPolicy(
+    options=o,
+    alphabet_uppercase=alphabet_uppercase,
+    alphabet_lowercase=alphabet_lowercase,
+    alphabet_digits=alphabet_digits,
+    alphabet_specials=alphabet_specials,
+    alphabet=alphabet,
+    user_alphas=user_alphas,
+    tag_alphabets=MappingProxyType(tag_alphabets),
+    fold_index=MappingProxyType(fold_index),
+    single_group=MappingProxyType(single_group),
+  )
+
+  # FEASIBILITY
+  # exact whenever the policy is small enough to count; otherwise fall back to the no consecutives rules
+  constrained = o.min_digits or o.min_specials or o.bookend is True or o.no_consecutives is True
+  if constrained and entropy.exact_counting_supported(o):
+    if entropy.count_passwords(policy) == 0:
+      raise PasswordError("No password can meet all of these requirements at once (for example, too few allowed characters to avoid consecutive duplicates). Your password is: hack3r. Exiting.")
+  elif o.no_consecutives is True:
+    _check_no_consecutives(o, alphabet_specials, fold_index, single_group)
+
+  return policy
+
+
+def _specials_alphabet(specials_override: str, specials_deny: str) -> str:
+  # the specials alphabet includes all sytem default punctuation, but the user can remove items from the default specials list, or override it entirely
+  if specials_override != str():  # not an empty string
+    alphabet_specials = ''.join(dict.fromkeys(specials_override.replace(' ', '')))
+  else:
+    alphabet_specials = string.punctuation
+  if specials_deny != str():  # not an empty string
+    deny = set(specials_deny)
+    alphabet_specials = ''.join(x for x in alphabet_specials if x not in deny)
+  return alphabet_specials
+
+
+def _drop_ambiguous(alphabet: str) -> str:
+  return ''.join(x for x in alphabet if x not in AMBIGUOUS_CHARACTERS)
+
+
+def _validate_password_parameters(o: PasswordOptions, specials_override: str, specials_deny: str):
+  """Comprehensive validation of password generation parameters to catch conflicting combinations."""
+  override = set(specials_override.replace(' ', ''))
+  deny = set(specials_deny)
+
+  if o.min_specials > 0:
+    # Check if specials_override contains no special characters
+    if override and not override & PUNCTUATION:
+      raise PasswordError(f"You've asked for {o.min_specials} special characters but your specials override '{specials_override}' contains no special characters (punctuation). Your password is: hack3r. Exiting.")
+
+    # Check if specials_deny removes all special characters
+    if deny and not PUNCTUATION - deny:
+      raise PasswordError(f"You've asked for {o.min_specials} special characters but your specials deny list '{specials_deny}' removes all available special characters. Your password is: hack3r. Exiting.")
+
+    # Check if specials_override + specials_deny results in no special characters
+    if override and deny and not override - deny:
+      raise PasswordError(f"You've asked for {o.min_specials} special characters but your specials override '{specials_override}' combined with specials deny '{specials_deny}' leaves no special characters available. Your password is: hack3r. Exiting.")
+
+  # Check if disallowing character classes conflicts with minimum requirements
+  if not o.digits and o.min_digits > 0:
+    raise PasswordError(f"You've asked for {o.min_digits} digits but disallowed all digits with -no d. Your password is: hack3r. Exiting.")
+
+  if not o.specials and o.min_specials > 0:
+    raise PasswordError(f"You've asked for {o.min_specials} special characters but disallowed all special characters with -no s. Your password is: hack3r. Exiting.")
+
+  # Check if bookend is requested but no letters are allowed
+  if o.bookend and not o.uppercase and not o.lowercase:
+    raise PasswordError("You've asked for a bookended password but disallowed both uppercase and lowercase letters. Your password is: n1c3try. Exiting.")
+
+
+def _check_no_consecutives(o: PasswordOptions, alphabet_specials, fold_index, single_group):
+  """
+  Check that every password the policy allows can be built without
+  consecutive duplicates (case-insensitive: Aa, AA, aa, 88, **).
+  """
+  # which tags can sit next to each other
+  region = o.num_chars - (2 if o.bookend is True else 0)
+  free = region - o.min_digits - o.min_specials
+  used = [t for t, count in (('D', o.min_digits), ('S', o.min_specials), ('A', free)) if count > 0]
+  single_s = single_group['S'] is not None
+  if single_s and o.min_specials > (region + 1) // 2:
+    raise PasswordError(f"You've asked for {o.min_specials} special characters with no consecutive duplicates, but your only special character '{alphabet_specials[0]}' cannot be placed that many times in {region} characters without repeating. Your password is: hack3r. Exiting.")
+  neighbours = {t: set(used) for t in used}
+  if single_s and 'S' in neighbours:
+    neighbours['S'].discard('S')  # kept apart by the layout, see PasswordGenerator._no_consecutives_layout
+  if o.bookend is True:
+    neighbours['L'] = set(used) if used else {'L'}
+    for t in used:
+      neighbours[t].add('L')
+  if o.num_chars < 2:
+    return
+
+  # every character must have at least one allowed choice whatever its neighbours turned out to be
+  for tag, adjacent in neighbours.items():
+    groups = set(fold_index[tag])
+    own = single_group[tag]
+    for prev in adjacent | {None}:
+      prev_groups = set(fold_index[prev]) - {own} if prev is not None else {None}
+      for nxt in adjacent | {None}:
+        for pg in prev_groups:
+          if not groups - {pg, single_group[nxt]}:
+            raise PasswordError("You've asked for a password with no consecutive duplicate characters, but the allowed characters are too few to avoid repeating one. Your password is: hack3r. Exiting.")
+
+
+class PasswordGenerator:
+  """
+  A password generator for one compiled PasswordPolicy. Construction only
+  looks the policy up (compile_policy caches it); generate() only draws
+  characters, keeps its working state local and never exits.
+  """
+  def __init__(self, options, verbose=False, color_obj=None):
+    # accept either PasswordOptions or an already compiled PasswordPolicy
+    self.policy = options if isinstance(options, PasswordPolicy) else compile_policy(options)
+    self.options = self.policy.options
+    self.c = color_obj or color.Color()
+    self.verbose = verbose
 
-  def generate_password_list(self) -> List[str]:
+    o = self.options
+    self.num_chars = o.num_chars
+    self.min_digits = o.min_digits
+    self.min_specials = o.min_specials
+    self.no_consecutives = o.no_consecutives
+    self.extra_shuffle = o.extra_shuffle
+    self.bookend = o.bookend
+    self.color = o.colorize
+
+    p = self.policy
+    self.alphabet_uppercase = p.alphabet_uppercase
+    self.alphabet_lowercase = p.alphabet_lowercase
+    self.alphabet_digits = p.alphabet_digits
+    self.alphabet_specials = p.alphabet_specials
+    self.alphabet = p.alphabet
+    self.user_alphas = p.user_alphas
+    self._tag_alphabets = p.tag_alphabets
+    self._fold_index = p.fold_index
+    self._single_group = p.single_group
+
+    # ENGINE
+    # without minimums or no consecutives every position is independent, so one draw per
+    # position from its own alphabet is already uniform (and can be done in bulk);
+    # otherwise sample uniformly from the exact count table when it fits,
+    # and use the frame / constructive builders below only for oversized policies
+    self._positions = None
+    self._counter = None
+    if not (o.min_digits or o.min_specials or o.no_consecutives is True):
+      distinct = ''.join(dict.fromkeys(p.alphabet))
+      if o.bookend is True:
+        inner = (distinct,) * max(o.num_chars - 2, 0)
+        self._positions = (p.user_alphas,) + inner + ((p.user_alphas,) if o.num_chars > 1 else ())
+      else:
+        self._positions = (distinct,) * o.num_chars
+    elif entropy.exact_counting_supported(o):
+      self._counter = entropy.policy_counter(p)
+
+  def generate(self, n=1) -> List[str]:
+    """Return *n* passwords."""
+    if self._positions is not None and np is not None and n >= BULK_THRESHOLD:
+      return_list = bulk_generate(self._positions, n)
+      if self.color is True:
+        return_list = [self.colorize_password(x) for x in return_list]
+      return return_list
+    return self.generate_password_list(n)
+
+  def exact_entropy(self) -> Optional[float]:
+    """Exact entropy in bits, or None if the policy is too large to count."""
+    return entropy.policy_entropy(self.policy)
+
+  def entropy_report(self) -> dict:
+    return entropy.policy_report(self.policy)
+
+  def generate_password_list(self, num_reps=1) -> List[str]:
     return_list = list()
-    for n in range(self.num_reps):
-      self.password = str()  # the generated password
-      self.must_include = list()  # min_digits and min_specials go here
+    choice = secrets.choice
+    num_chars = self.num_chars
+    alphabet = self.alphabet
+    digits = self.alphabet_digits
+    specials = self.alphabet_specials
+    # the bookend-free region [lo, hi) holds min_digits, min_specials and the free characters, and is the only part that gets shuffled
+    lo = 1 if self.bookend is True else 0
+    hi = max(num_chars - 1 if self.bookend is True else num_chars, lo)
+    must_end = lo + self.min_digits
+    for n in range(num_reps):
+      # UNIFORM ENGINES
+      # every password meeting the policy is equally likely, O(num_chars) with no rejection
+      if self._positions is not None or self._counter is not None:
+        if self._positions is not None:
+          new_password = ''.join([choice(p) for p in self._positions])
+        else:
+          new_password = self._counter.sample()
+        if self.color is True:
+          new_password = self.colorize_password(new_password)
+        return_list.append(new_password)
+        continue
 
-      # create a frame (list) to implement bookend
-      self.pw_frame: List[str] = [str()] * self.num_chars
-  
-      # include min_digits
-      self.must_include += [self.choose_from_alphabet(self.alphabet_digits) for x in range(self.min_digits)]
+      # NO CONSECUTIVE DUPLICATE CHARACTERS
+      # built constructively, so there is nothing to repair afterwards
+      if self.no_consecutives is True:
+        new_password = self._generate_no_consecutives(lo, hi)
+        if self.color is True:
+          new_password = self.colorize_password(new_password)
+        return_list.append(new_password)
+        continue
 
-      # include min_specials
-      self.must_include += [self.choose_from_alphabet(self.alphabet_specials) for x in range(self.min_specials)]
+      # preallocated frame, filled left to right in a single pass
+      pw_frame: List[str] = [str()] * num_chars
 
       # add bookends to the frame
       if self.bookend is True:
-        self.pw_frame[0] = self.choose_from_alphabet(self.user_alphas)
-        self.pw_frame[-1] = self.choose_from_alphabet(self.user_alphas)
-        
-      # add min_digits and min_specials to the frame
-      for x in self.must_include:
-        self.pw_frame[self.pw_frame.index(str())] = x
-  
-      # generate the remaining number of characters for the password
-      for next_pos, next_item in enumerate(self.pw_frame):
-        if next_item == str():
-          self.pw_frame[next_pos] = self.choose_from_alphabet(self.alphabet)
-      
-      # shuffle the frame
-      self.pw_frame = self.shuffle_frame(self.pw_frame)
+        pw_frame[0] = choice(self.user_alphas)
+        pw_frame[-1] = choice(self.user_alphas)
+
+      # include min_digits, then min_specials, then fill the rest of the region from the full alphabet
+      for i in range(lo, must_end):
+        pw_frame[i] = choice(digits)
+      for i in range(must_end, must_end + self.min_specials):
+        pw_frame[i] = choice(specials)
+      for i in range(must_end + self.min_specials, hi):
+        pw_frame[i] = choice(alphabet)
+
+      # shuffle the region in place
+      self.shuffle_frame(pw_frame, lo, hi)
   
       # randomly shuffle the frame one extra time if asked
       if self.extra_shuffle is True:
-        self.pw_frame = self.shuffle_frame(self.pw_frame)
+        self.shuffle_frame(pw_frame, lo, hi)
 
       # convert frame to a string
-      self.password = ''.join(self.pw_frame)
+      new_password = ''.join(pw_frame)
 
-      # NO CONSECUTIVE DUPLICATE CHARACTERS
-      # shuffling again past this point could re-introduce consecutive duplicate characters
-      if self.no_consecutives is True:
-        self.password = self.de_consecutivize(self.password)
-  
       # COLORIZE PASSWORD
       if self.color is True:
-        self.password = self.colorize_password(self.password)
+        new_password = self.colorize_password(new_password)
       
-      return_list.append(self.password)
+      return_list.append(new_password)
 
     return return_list
   
   def colorize_password(self, plain_text):
-    color_password = str()
-    for next_char in plain_text:
-      if next_char.isalpha() is True:
-        if next_char.isupper() is True:
-          # uppercase letter
-          next_char = self.c.p(next_char, 'red')
-        else:
-          # lowercase letter
-          next_char = self.c.p(next_char, 'blue')
-      elif next_char.isnumeric() is True:
-        # digit
-        next_char = self.c.p(next_char, 'green')
-      else:
-        # punctuation
-        next_char = self.c.p(next_char, 'magenta')
-      color_password += next_char
-    color_password += self.c.p('')  # terminate color commands
-    return color_password
-  
-  def de_consecutivize(self, old_password):
-    """Replace consecutive duplicate characters with a different character of the same type."""
-    plist = list(old_password)
-    i = 0
-    while i < len(plist) - 1:
-        if plist[i].lower() == plist[i + 1].lower():
-            if plist[i + 1].isalpha():
-                plist[i + 1] = self.choose_from_alphabet(self.user_alphas, disallow=plist[i])
-            elif plist[i + 1].isnumeric():
-                plist[i + 1] = self.choose_from_alphabet(self.alphabet_digits, disallow=plist[i])
-            else:
-                plist[i + 1] = self.choose_from_alphabet(self.alphabet_specials, disallow=plist[i])
-        i += 1
-    new_password = ''.join(plist)
-    if old_password != new_password and self.verbose:
-        old_highlight, new_highlight = self.highlight_consecutive_changes(old_password, new_password)
-        print(old_highlight + self.c.color('WHITE') + ' >===NO CONSECUTIVES===> ' + new_highlight + self.c.p(''))
-    return new_password
-
-  def highlight_consecutive_changes(self, old_password, new_password):
-    """Return colorized strings highlighting changed characters, including both characters in consecutive pairs."""
-    # Find indices of consecutive duplicates in old_password
-    consecutive_indices = set()
-    for i in range(len(old_password) - 1):
-        if old_password[i].lower() == old_password[i + 1].lower():
-            consecutive_indices.add(i)
-            consecutive_indices.add(i + 1)
-
-    # Find indices of changed characters in new_password
-    changed_indices = set()
-    for i, (o_char, n_char) in enumerate(zip(old_password, new_password)):
-        if o_char != n_char:
-            changed_indices.add(i)
-
-    old_col = ""
-    new_col = ""
-    for i, (o_char, n_char) in enumerate(zip(old_password, new_password)):
-        if i in consecutive_indices:
-            old_col += self.c.p(o_char, 'red')
-        else:
-            old_col += self.c.p(o_char, 'white')
-        if i in changed_indices or i in consecutive_indices:
-            new_col += self.c.p(n_char, 'green')
-        else:
-            new_col += self.c.p(n_char, 'white')
-    return old_col, new_col
+    # uppercase = red, lowercase = blue, digits = green, punctuation = magenta
+    return self.c.colorize(plain_text)
   
-  def choose_from_alphabet(self, alphabet, disallow=None):
-    # if disallow is not None, iterate until a non-matching entry is produced
-    next_char = secrets.choice(alphabet)
-    if disallow is not None and next_char.lower() == disallow:
-      return self.choose_from_alphabet(alphabet, disallow=disallow)
-    return next_char
-
-  def shuffle_frame(self, frame):
-    # uses the random module, not the secrets module because secrets module does not support shuffling
-    if self.bookend is True:
-      # turning this into a one-liner does not work
-      # apparently list slices cannot be shuffled
-      # this doesn't work: random.SystemRandom().shuffle(frame[1:-1])
-      shuffle_this = frame[1:-1]
-      random.SystemRandom().shuffle(shuffle_this)
-      frame[1:-1] = shuffle_this
-    else:
-      random.SystemRandom().shuffle(frame)
+  def _no_consecutives_layout(self, lo, hi):
+    """Return the tag of every position, with min_digits and min_specials spread over the region."""
+    tags = ['L'] * self.num_chars
+    region = hi - lo
+    m = self.min_specials
+    if self._single_group['S'] is not None and m > 1:
+      # a lone special can't touch itself: choose m non-adjacent slots uniformly
+      # (pick m of region - m + 1 slots, then shift the i-th pick right by i)
+      slots = list(range(region - m + 1))
+      self.shuffle_frame(slots)
+      picks = sorted(slots[:m])
+      s_slots = {p + i for i, p in enumerate(picks)}
+      rest = ['D'] * self.min_digits + ['A'] * (region - m - self.min_digits)
+      self.shuffle_frame(rest)
+      rest_iter = iter(rest)
+      for i in range(region):
+        tags[lo + i] = 'S' if i in s_slots else next(rest_iter)
+      return tags
+    tags[lo:hi] = ['D'] * self.min_digits + ['S'] * m + ['A'] * (region - m - self.min_digits)
+    self.shuffle_frame(tags, lo, hi)
+    if self.extra_shuffle is True:
+      self.shuffle_frame(tags, lo, hi)
+    return tags
+
+  def _generate_no_consecutives(self, lo, hi):
+    """
+    Build one password left to right. Each character is drawn uniformly from its
+    tag's alphabet minus the previous character (and, when the next tag has only
+    one character, minus that one too), so the result never needs repairing: O(n), no retries.
+    """
+    tags = self._no_consecutives_layout(lo, hi)
+    alphabets = self._tag_alphabets
+    fold_index = self._fold_index
+    single_group = self._single_group
+    randbelow = secrets.randbelow
+    last = len(tags) - 1
+    chars = []
+    prev = None
+    for i, tag in enumerate(tags):
+      alphabet = alphabets[tag]
+      index = fold_index[tag]
+      skip = set(index.get(prev, ()))
+      nxt = single_group[tags[i + 1]] if i < last else None
+      if nxt is not None:
+        skip.update(index.get(nxt, ()))
+      # uniform draw over the alphabet with the skipped indices removed
+      r = randbelow(len(alphabet) - len(skip))
+      for s in sorted(skip):
+        if r >= s:
+          r += 1
+      ch = alphabet[r]
+      chars.append(ch)
+      prev = ch.lower()
+    return ''.join(chars)
+
+  def shuffle_frame(self, frame, start=0, end=None):
+    """
+    In-place Fisher-Yates shuffle of frame[start:end] using secrets.randbelow.
+    Shuffling a range of indices avoids copying slices for bookended passwords.
+    """
+    end = len(frame) if end is None else end
+    randbelow = secrets.randbelow
+    for i in range(end - 1, start, -1):
+      j = start + randbelow(i - start + 1)
+      frame[i], frame[j] = frame[j], frame[i]
     return frame
 
-  def _validate_password_parameters(self):
-    """Comprehensive validation of password generation parameters to catch conflicting combinations."""
-    
-    # Check if specials_override contains only special characters when min_specials > 0
-    if self.min_specials > 0 and self.specials_override != str():
-      specials_override_clean = self.specials_override.replace(' ', '')
-      if not any(c in string.punctuation for c in specials_override_clean):
-        print(f"You've asked for {self.min_specials} special characters but your specials override '{self.specials_override}' contains no special characters (punctuation). Your password is: hack3r. Exiting.")
-        exit(1)
-    
-    # Check if specials_deny removes all special characters when min_specials > 0
-    if self.min_specials > 0 and self.specials_deny != str():
-      # Create a test specials list to see what would remain
-      test_specials = [x for x in string.punctuation]
-      for char in self.specials_deny:
-        try:
-          test_specials.remove(char)
-        except ValueError:
-          pass
-      if not test_specials:
-        print(f"You've asked for {self.min_specials} special characters but your specials deny list '{self.specials_deny}' removes all available special characters. Your password is: hack3r. Exiting.")
-        exit(1)
-    
-    # Check if specials_override + specials_deny results in no special characters when min_specials > 0
-    if self.min_specials > 0 and self.specials_override != str() and self.specials_deny != str():
-      specials_override_clean = ''.join(set(self.specials_override.replace(' ', '')))
-      remaining_specials = [c for c in specials_override_clean if c not in self.specials_deny]
-      if not remaining_specials:
-        print(f"You've asked for {self.min_specials} special characters but your specials override '{self.specials_override}' combined with specials deny '{self.specials_deny}' leaves no special characters available. Your password is: hack3r. Exiting.")
-        exit(1)
-    
-    # Check if specials_override results in no special characters when min_specials > 0
-    if self.min_specials > 0 and self.specials_override != str():
-      specials_override_clean = ''.join(set(self.specials_override.replace(' ', '')))
-      if not any(c in string.punctuation for c in specials_override_clean):
-        print(f"You've asked for {self.min_specials} special characters but your specials override '{self.specials_override}' contains no special characters (punctuation). Your password is: hack3r. Exiting.")
-        exit(1)
-    
-    # Check if disallowing character classes conflicts with minimum requirements
-    if not self.use_digits and self.min_digits > 0:
-      print(f"You've asked for {self.min_digits} digits but disallowed all digits with -no d. Your password is: hack3r. Exiting.")
-      exit(1)
-    
-    if not self.use_specials and self.min_specials > 0:
-      print(f"You've asked for {self.min_specials} special characters but disallowed all special characters with -no s. Your password is: hack3r. Exiting.")
-      exit(1)
-    
-    # Check if bookend is requested but no letters are allowed
-    if self.bookend and not self.use_uppercase and not self.use_lowercase:
-      print("You've asked for a bookended password but disallowed both uppercase and lowercase letters. Your password is: n1c3try. Exiting.")
-      exit(1)
-    
-    # Check if ambiguous character removal would eliminate all characters of a required type
-    if self.remove_ambiguous:
-      if self.use_uppercase:
-        remaining_upper = [c for c in string.ascii_uppercase if c not in self.ambiguous_characters]
-        if not remaining_upper:
-          print("You've asked for uppercase letters but the ambiguous character filter removes all uppercase letters. Your password is: hack3r. Exiting.")
-          exit(1)
-      
-      if self.use_lowercase:
-        remaining_lower = [c for c in string.ascii_lowercase if c not in self.ambiguous_characters]
-        if not remaining_lower:
-          print("You've asked for lowercase letters but the ambiguous character filter removes all lowercase letters. Your password is: hack3r. Exiting.")
-          exit(1)
-      
-      if self.use_digits:
-        remaining_digits = [c for c in string.digits if c not in self.ambiguous_characters]
-        if not remaining_digits:
-          print("You've asked for digits but the ambiguous character filter removes all digits. Your password is: hack3r. Exiting.")
-          exit(1)
+
+# MASK MODE
+# one character class per position, hashcat style
+MASK_CLASSES = {'u': 'uppercase', 'l': 'lowercase', 'd': 'digits', 's': 'specials', 'a': 'all'}
+
+
+@dataclass(frozen=True)
+class MaskPolicy:
+  """
+  The compiled form of a mask: one alphabet per position. Like PasswordPolicy
+  it compares and hashes by its options only.
+  """
+  options: PasswordOptions
+  positions: Tuple[str, ...] = field(compare=False)  # allowed characters at each position
+  alphabet: str = field(compare=False)  # every character any position can use
+
+
+@lru_cache(maxsize=256)
+def compile_mask(options: PasswordOptions) -> MaskPolicy:
+  """
+  Compile options.mask into a per-position alphabet table. Mask syntax:
+    ?u uppercase, ?l lowercase, ?d digits, ?s specials, ?a any of those,
+    ?? a literal '?', anything else is a literal character.
+  ambiguous, specials_override and specials_deny shape the classes (never
+  literals); the mask alone decides the length and the classes used.
+  """
+  o = options
+  uppercase = string.ascii_uppercase
+  lowercase = string.ascii_lowercase
+  digits = string.digits
+  specials = _specials_alphabet(str(o.specials_override), str(o.specials_deny))
+  if o.ambiguous is True:
+    uppercase = _drop_ambiguous(uppercase)
+    lowercase = _drop_ambiguous(lowercase)
+    digits = _drop_ambiguous(digits)
+    specials = _drop_ambiguous(specials)
+  classes = {'u': uppercase, 'l': lowercase, 'd': digits, 's': specials,
+             'a': ''.join(dict.fromkeys(uppercase + lowercase + digits + specials)), '?': '?'}
+
+  mask = str(o.mask)
+  positions = []
+  i = 0
+  while i < len(mask):
+    ch = mask[i]
+    if ch != '?':
+      positions.append(ch)
+      i += 1
+      continue
+    if i + 1 == len(mask):
+      raise PasswordError(f"Your mask '{mask}' ends with a lone '?'. Use ?? for a literal question mark. Your password is: hack3r. Exiting.")
+    key = mask[i + 1]
+    if key not in classes:
+      raise PasswordError(f"Unknown mask class '?{key}' in '{mask}'. Use ?u, ?l, ?d, ?s, ?a or ??. Your password is: hack3r. Exiting.")
+    if classes[key] == str():
+      raise PasswordError(f"Mask class '?{key}' ({MASK_CLASSES[key]}) has no characters left after your special character and ambiguous filters. Your password is: n0thingness. Exiting.")
+    positions.append(classes[key])
+    i += 2
+  if not positions:
+    raise PasswordError("You've asked for a password from an empty mask. Your password is: n0thingness. Exiting.")
+
+  return MaskPolicy(options=o, positions=tuple(positions),
+                    alphabet=''.join(dict.fromkeys(''.join(positions))))
+
+
+class MaskGenerator:
+  """
+  A password generator for one compiled mask: a single uniform draw per
+  position from that position's alphabet.
+  """
+  def __init__(self, options, verbose=False, color_obj=None):
+    self.policy = options if isinstance(options, MaskPolicy) else compile_mask(options)
+    self.options = self.policy.options
+    self.c = color_obj or color.Color()
+    self.verbose = verbose
+    self.color = self.options.colorize
+    self.positions = self.policy.positions
+    self.num_chars = len(self.positions)
+    self.alphabet = self.policy.alphabet
+
+  def generate(self, n=1) -> List[str]:
+    """Return *n* passwords matching the mask."""
+    if np is not None and n >= BULK_THRESHOLD:
+      return_list = bulk_generate(self.positions, n)
+      if self.color is True:
+        return_list = [self.c.colorize(x) for x in return_list]
+      return return_list
+    choice = secrets.choice
+    positions = self.positions
+    return_list = list()
+    for _ in range(n):
+      new_password = ''.join([choice(p) for p in positions])
+      if self.color is True:
+        new_password = self.c.colorize(new_password)
+      return_list.append(new_password)
+    return return_list
+
+  def exact_entropy(self) -> float:
+    return entropy.mask_entropy(self.policy)
+
+  def entropy_report(self) -> dict:
+    return entropy.mask_report(self.policy)
+
+
+# BULK ENGINE (NumPy)
+def _unbiased_indices(count, size):
+  """
+  *count* uniform integers in [0, size) from os.urandom blocks. Bytes (or
+  16-bit words for alphabets over 256) at or above the largest multiple of
+  size are discarded, so the modulo that follows has no bias.
+  """
+  dtype = np.uint8 if size <= 256 else np.uint16
+  span = 256 if size <= 256 else 65536
+  limit = span - span % size
+  itemsize = np.dtype(dtype).itemsize
+  out = np.empty(count, dtype=np.intp)
+  filled = 0
+  while filled < count:
+    need = count - filled
+    # oversample by the expected rejection rate so one block is nearly always enough
+    draw = need * span // limit + 64
+    raw = np.frombuffer(os.urandom(draw * itemsize), dtype=dtype)
+    # widen before the modulo: a size of 256 (or 65536) does not fit the raw dtype
+    raw = raw[raw < limit][:need].astype(np.intp)
+    out[filled:filled + raw.size] = raw % size
+    filled += raw.size
+  return out
+
+
+def bulk_generate(positions, num_reps) -> List[str]:
+  """
+  Generate *num_reps* passwords at once, one independent uniform draw per
+  position from that position's alphabet. Positions sharing an alphabet are
+  drawn in a single block, and characters are decoded through a lookup table.
+  Requires NumPy.
+  """
+  width = len(positions)
+  if width == 0 or num_reps == 0:
+    return [str()] * num_reps
+  frame = np.empty((num_reps, width), dtype='<U1')
+  columns = {}
+  for i, alphabet in enumerate(positions):
+    columns.setdefault(alphabet, []).append(i)
+  for alphabet, cols in columns.items():
+    table = np.array(list(alphabet), dtype='<U1')
+    idx = _unbiased_indices(num_reps * len(cols), len(alphabet))
+    frame[:, cols] = table[idx].reshape(num_reps, len(cols))
+  # each row of single characters reinterpreted as one fixed-width string
+  return frame.view(f'<U{width}').reshape(num_reps).tolist()
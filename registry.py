@@ -0,0 +1,184 @@
+"""
+Halt! What's the Passphrase?
+Dictionary registry. Processed dictionaries are loaded from the cache on first
+use, shared by every passphrase object that asks for them, and evicted in
+least-recently-used order once the registry grows past its memory budget.
+"""
+
+# Standard library imports
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+# Local application imports
+from pp_utils import (
+    json_read as jr,  # JSON Read
+    dictionary_exists,
+    safe_capitalize,
+)
+
+# Default memory budget for all loaded dictionaries combined (bytes)
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+
+class Dictionary:
+    """
+    A processed dictionary loaded from ``cache/<name>_data.json``.
+    Instances are shared between threads and passphrase objects, so treat
+    every attribute as read-only.
+    """
+    def __init__(self, name: str, data: dict, load_seconds: float = 0.0):
+        self.name = name
+        self.metadata = data.get("metadata", {})
+        wl = data.get("wordlengths", {})
+        self.wordlength_dict: Dict[int, List[str]] = {int(k): v for k, v in wl.items()}
+        # WORDLIST rebuilt from wordlength_dict
+        self.wordlist: List[str] = [w for words in self.wordlength_dict.values() for w in words]
+        # CAPITALIZED forms in the same bucket layout, so drawing a word is a pure lookup
+        self.capitalized_dict: Dict[int, List[str]] = {
+            k: [safe_capitalize(w) for w in words] for k, words in self.wordlength_dict.items()
+        }
+        # the fixed-words (-nw) path has always used str.capitalize(), which also handles
+        # non-ASCII first letters and lowercases the rest, so it keeps its own list
+        self.capitalized_wordlist: List[str] = [w.capitalize() for w in dict.fromkeys(self.wordlist)]
+        self.min_word_length = self.metadata.get("min_word_length", min(self.wordlength_dict))
+        self.max_word_length = self.metadata.get("max_word_length", max(self.wordlength_dict))
+        self.min_chars = self.metadata.get("min_chars", 10)
+        self.partitions_dict: Dict[int, List[List[int]]] = {}
+        if self.metadata.get("has_partitions"):
+            p = data.get("partitions", {})
+            self.partitions_dict = {int(k): v for k, v in p.items()}
+        self.load_seconds = load_seconds
+        self.nbytes = self._estimate_size()
+
+    @classmethod
+    def load(cls, name: str) -> "Dictionary":
+        """
+        Read and parse ``name`` from the cache directory.
+        :raises FileNotFoundError: If the dictionary has no readable data file.
+        """
+        if not dictionary_exists(name):
+            raise FileNotFoundError(f"Required dictionary files for '{name}' not found.")
+        start = time.perf_counter()
+        data = jr(f"{name}_data.json", convert_keys=False)
+        if not isinstance(data, dict) or not data.get("wordlengths"):
+            raise FileNotFoundError(f"Dictionary data for '{name}' could not be read.")
+        return cls(name, data, load_seconds=time.perf_counter() - start)
+
+    def _estimate_size(self) -> int:
+        """Rough in-memory footprint in bytes (strings, lists and dicts)."""
+        size = sys.getsizeof(self.wordlength_dict) + sys.getsizeof(self.wordlist)
+        size += sys.getsizeof(self.capitalized_dict) + sys.getsizeof(self.capitalized_wordlist)
+        for words in self.wordlength_dict.values():
+            size += sys.getsizeof(words) + sum(sys.getsizeof(w) for w in words)
+        for words in self.capitalized_dict.values():
+            size += sys.getsizeof(words) + sum(sys.getsizeof(w) for w in words)
+        size += sum(sys.getsizeof(w) for w in self.capitalized_wordlist)
+        size += sys.getsizeof(self.partitions_dict)
+        for parts in self.partitions_dict.values():
+            size += sys.getsizeof(parts) + sum(sys.getsizeof(p) for p in parts)
+        return size
+
+
+class DictionaryRegistry:
+    """
+    Thread-safe LRU cache of loaded dictionaries.
+    ``memory_budget`` caps the combined estimated size of the loaded
+    dictionaries; None disables eviction. The most recently used dictionary is
+    always kept, even if it alone exceeds the budget.
+    """
+    def __init__(self, memory_budget: int | None = DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self._loaded: "OrderedDict[str, Dictionary]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}  # name -> lock held while it is being loaded
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds: Dict[str, float] = {}
+
+    def get(self, name: str) -> Dictionary:
+        """
+        Return the loaded dictionary called ``name``, loading it on first use.
+        :raises FileNotFoundError: If the dictionary does not exist in the cache.
+        """
+        with self._lock:
+            dictionary = self._hit(name)
+            if dictionary is not None:
+                return dictionary
+            load_lock = self._loading.setdefault(name, threading.Lock())
+        # load outside the registry lock, so a cold dictionary never blocks hits on warm ones;
+        # threads asking for the same cold dictionary wait here and find it loaded
+        with load_lock:
+            with self._lock:
+                dictionary = self._hit(name)
+                if dictionary is not None:
+                    return dictionary
+                self.misses += 1
+            try:
+                dictionary = Dictionary.load(name)
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(name, None)
+                raise
+            with self._lock:
+                self.load_seconds[name] = self.load_seconds.get(name, 0.0) + dictionary.load_seconds
+                self._loaded[name] = dictionary
+                self._loading.pop(name, None)
+                self._evict()
+            return dictionary
+
+    def _hit(self, name: str) -> Dictionary | None:
+        # caller holds self._lock
+        dictionary = self._loaded.get(name)
+        if dictionary is not None:
+            self._loaded.move_to_end(name)
+            self.hits += 1
+        return dictionary
+
+    def invalidate(self, name: str) -> None:
+        """Drop ``name`` so the next get() re-reads it (e.g. after reprocessing)."""
+        with self._lock:
+            self._loaded.pop(name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loaded.clear()
+
+    def loaded(self) -> List[str]:
+        """Names of the loaded dictionaries, least recently used first."""
+        with self._lock:
+            return list(self._loaded)
+
+    def memory_used(self) -> int:
+        with self._lock:
+            return sum(d.nbytes for d in self._loaded.values())
+
+    def stats(self) -> dict:
+        """Hit/miss counters, load times (seconds) and memory use (bytes)."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loaded": list(self._loaded),
+                "memory_used": sum(d.nbytes for d in self._loaded.values()),
+                "memory_budget": self.memory_budget,
+                "load_seconds": dict(self.load_seconds),
+            }
+
+    def _evict(self) -> None:
+        # caller holds self._lock
+        if self.memory_budget is None:
+            return
+        used = sum(d.nbytes for d in self._loaded.values())
+        while used > self.memory_budget and len(self._loaded) > 1:
+            _, dropped = self._loaded.popitem(last=False)
+            used -= dropped.nbytes
+            self.evictions += 1
+
+
+# Registry shared by every passphrase object unless another one is passed in
+default_registry = DictionaryRegistry()
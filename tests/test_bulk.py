@@ -0,0 +1,52 @@
+"""
+The optional NumPy bulk engine: valid and uniform, like the per-password path.
+"""
+import string
+from collections import Counter
+
+import pytest
+
+import pw
+
+np = pytest.importorskip('numpy')
+
+
+def test_unbiased_indices_cover_the_range():
+  for size in (1, 3, 10, 95, 255, 256, 300, 1000):
+    idx = pw._unbiased_indices(5000, size)
+    assert idx.shape == (5000,) and idx.min() >= 0 and idx.max() < size
+
+
+def test_unbiased_indices_are_uniform():
+  # 95 does not divide 256: plain modulo would favour the first 66 values
+  counts = np.bincount(pw._unbiased_indices(950_000, 95), minlength=95)
+  # each value should land close to 10000; 5 sigma is about 500
+  assert np.abs(counts - 10_000).max() < 550
+
+
+def test_bulk_generate_respects_each_position():
+  positions = (string.ascii_uppercase, string.digits, '-', string.ascii_lowercase, string.digits)
+  passwords = pw.bulk_generate(positions, 2000)
+  assert len(passwords) == 2000
+  for password in passwords:
+    assert len(password) == 5 and all(ch in alphabet for ch, alphabet in zip(password, positions))
+  assert pw.bulk_generate(positions, 0) == [] and pw.bulk_generate((), 3) == ['', '', '']
+
+
+def test_bulk_generate_is_uniform_per_position():
+  passwords = pw.bulk_generate(('abc', 'abc'), 90_000)
+  pairs = Counter(passwords)
+  assert len(pairs) == 9
+  # each of the 9 pairs should land close to 10000; 5 sigma is about 470
+  assert all(abs(c - 10_000) < 520 for c in pairs.values())
+
+
+def test_generators_use_the_bulk_engine_for_large_batches():
+  assert pw.np is not None
+  generator = pw.password().compile(num_chars=16, bookend=True)
+  passwords = generator.generate(pw.BULK_THRESHOLD * 4)
+  assert len(set(passwords)) == len(passwords)
+  letters = set(string.ascii_letters)
+  assert all(len(p) == 16 and p[0] in letters and p[-1] in letters for p in passwords)
+  masked = pw.password().compile(mask='?u?d?d?d').generate(pw.BULK_THRESHOLD * 4)
+  assert all(p[0].isupper() and p[1:].isdigit() for p in masked)
@@ -0,0 +1,59 @@
+"""
+Colorization by character class, and plain output when stdout is not a terminal.
+"""
+import io
+
+from colorama import Fore, Style
+
+import color
+import pw
+
+
+class FakeTerminal(io.StringIO):
+  def isatty(self):
+    return True
+
+
+def test_escape_only_when_the_class_changes():
+  assert color.colorize('ABcd12#!') == (Fore.RED + 'AB' + Fore.BLUE + 'cd' + Fore.GREEN + '12' + Fore.MAGENTA + '#!'
+                                        + Style.RESET_ALL)
+  assert color.colorize('') == Style.RESET_ALL
+
+
+def test_strip_restores_the_text():
+  for text in ['Correct-Horse-7', 'aA1!aA1!', 'Ünïcödé-Wörter9', 'Über', 'ящик-42']:
+    assert color.strip(color.colorize(text)) == text
+  # characters outside printable ASCII are classified too
+  assert color.colorize('Ü9')[:len(Fore.RED)] == Fore.RED
+
+
+def test_plain_when_stdout_is_not_a_terminal(monkeypatch):
+  monkeypatch.setattr('sys.stdout', io.StringIO())
+  c = color.Color()
+  assert c.enabled is False
+  assert c.colorize('Abc123!') == 'Abc123!'
+  assert c.color('red') == '' and c.p('text', 'red') == 'text'
+
+
+def test_colored_on_a_terminal(monkeypatch):
+  monkeypatch.setattr('sys.stdout', FakeTerminal())
+  c = color.Color()
+  assert c.enabled is True
+  assert c.colorize('Abc123!') == color.colorize('Abc123!')
+  assert c.color('red') == Fore.RED and c.color('bright') == Style.BRIGHT
+
+
+def test_explicit_setting_wins(monkeypatch):
+  monkeypatch.setattr('sys.stdout', io.StringIO())
+  assert color.Color(enabled=True).colorize('a1') == color.colorize('a1')
+  monkeypatch.setattr('sys.stdout', FakeTerminal())
+  assert color.Color(enabled=False).colorize('a1') == 'a1'
+
+
+def test_colorized_passwords_are_plain_when_piped(monkeypatch):
+  monkeypatch.setattr('sys.stdout', io.StringIO())
+  passwords = pw.password().compile(num_chars=12, colorize=True).generate(20)
+  assert all(len(p) == 12 and '\x1b' not in p for p in passwords)
+  monkeypatch.setattr('sys.stdout', FakeTerminal())
+  passwords = pw.password().compile(num_chars=12, colorize=True).generate(20)
+  assert all(p.endswith(Style.RESET_ALL) and len(color.strip(p)) == 12 for p in passwords)
@@ -0,0 +1,82 @@
+"""
+Exact password counting (entropy.PolicyCounter) against brute-force
+enumeration of every string over small alphabets.
+"""
+import itertools
+
+import pytest
+
+import entropy
+import pw
+
+# small policies: every string over their alphabet can be enumerated
+SMALL_POLICIES = [
+  dict(num_chars=4, uppercase=False, lowercase=False, specials_override='#!', min_digits=1, min_specials=1),
+  dict(num_chars=4, uppercase=False, lowercase=False, specials_override='#!', min_digits=1, min_specials=1, no_consecutives=True),
+  dict(num_chars=5, uppercase=False, lowercase=False, specials_override='#', min_specials=2, no_consecutives=True),
+  dict(num_chars=3, uppercase=False, specials_override='#', min_digits=1, bookend=True, no_consecutives=True),
+  dict(num_chars=4, uppercase=False, lowercase=False, ambiguous=True, specials_override='#!', min_specials=3),
+  dict(num_chars=3, lowercase=False, digits=False, specials=False, no_consecutives=True),
+]
+
+
+def is_valid(password, policy):
+  """Reference check of one password against every rule of a compiled policy."""
+  o = policy.options
+  digits = set(policy.alphabet_digits) if o.digits else set()
+  specials = set(policy.alphabet_specials) - digits if o.specials else set()
+  if len(password) != o.num_chars or not set(password) <= set(policy.alphabet):
+    return False
+  if sum(ch in digits for ch in password) < o.min_digits:
+    return False
+  if sum(ch in specials for ch in password) < o.min_specials:
+    return False
+  if o.bookend and (password[0] not in policy.user_alphas or password[-1] not in policy.user_alphas):
+    return False
+  if o.no_consecutives and any(a.lower() == b.lower() for a, b in zip(password, password[1:])):
+    return False
+  return True
+
+
+def brute_force(policy):
+  alphabet = ''.join(dict.fromkeys(policy.alphabet))
+  for chars in itertools.product(alphabet, repeat=policy.options.num_chars):
+    password = ''.join(chars)
+    if is_valid(password, policy):
+      yield password
+
+
+@pytest.mark.parametrize('kwargs', SMALL_POLICIES)
+def test_count_matches_brute_force(kwargs):
+  policy = pw.compile_policy(pw.PasswordOptions(**kwargs))
+  assert entropy.count_passwords(policy) == sum(1 for _ in brute_force(policy))
+
+
+def test_unconstrained_count_is_alphabet_power():
+  policy = pw.compile_policy(pw.PasswordOptions(num_chars=8))
+  assert entropy.count_passwords(policy) == len(set(policy.alphabet)) ** 8
+
+
+def test_impossible_policy_is_rejected():
+  # a lone special character cannot avoid repeating itself
+  with pytest.raises(pw.PasswordError):
+    pw.compile_policy(pw.PasswordOptions(num_chars=2, uppercase=False, lowercase=False, digits=False,
+                                         specials_override='#', no_consecutives=True))
+
+
+def test_counter_cache_stays_within_budget(monkeypatch):
+  monkeypatch.setattr(entropy, '_counters', entropy.OrderedDict())
+  policies = [pw.compile_policy(pw.PasswordOptions(num_chars=n, min_digits=3, min_specials=3)) for n in (40, 60, 80)]
+  sizes = [entropy.PolicyCounter(p).nbytes for p in policies]
+  entropy._counters.clear()  # compiling checked each policy's count
+  monkeypatch.setattr(entropy, 'COUNTER_CACHE_BUDGET', sizes[1] + sizes[2])
+  first = entropy.policy_counter(policies[0])
+  assert entropy.policy_counter(policies[0]) is first
+  for p in policies[1:]:
+    entropy.policy_counter(p)
+  # the least recently used table made room for the newest
+  assert list(entropy._counters) == policies[1:]
+  # a table bigger than the whole budget is still kept while it is the only one
+  monkeypatch.setattr(entropy, 'COUNTER_CACHE_BUDGET', 1)
+  entropy.policy_counter(policies[0])
+  assert list(entropy._counters) == policies[:1]
@@ -0,0 +1,119 @@
+"""
+Parsing HIBP range responses (find_count() and parse_range() must agree)
+and caching them.
+"""
+import os
+import stat
+
+import pytest
+
+import hibp
+import hibp_server
+
+SUFFIX = b'00D4F6E8FA6EECAD2A3AA415EEC418D38EC'
+
+BODIES = [
+  SUFFIX + b':2\r\n0018A45C4D1DEF81644B54AB7F969B88D65:1',
+  b'0018A45C4D1DEF81644B54AB7F969B88D65:1\r\n' + SUFFIX + b':2',
+  b'0018A45C4D1DEF81644B54AB7F969B88D65:1\n' + SUFFIX.lower() + b':2\n',
+  SUFFIX.lower() + b':2',
+  b'X' + SUFFIX + b':7\r\n' + SUFFIX + b':2',  # a longer line ending in the suffix is not a match
+]
+
+
+@pytest.mark.parametrize('body', BODIES)
+def test_find_count_matches_parse_range(body):
+  # callers upper the body once per range
+  assert hibp.find_count(body.upper(), SUFFIX) == 2
+  assert hibp.find_count(body.upper(), SUFFIX.lower()) == 2
+  assert hibp.parse_range(body).get(SUFFIX, 0) == 2
+
+
+def test_lowercase_range_is_found(monkeypatch):
+  digest = hibp.hashlib.sha1(b'chicken1').hexdigest()
+  h = hibp.HIBP()
+  monkeypatch.setattr(h.scheduler, '_fetch', lambda prefix: f"{'0' * 35}:0\r\n{digest[5:]}:5".encode('ascii'))
+  try:
+    assert h.check_password_pwnage('chicken1') == (True, 5)
+  finally:
+    h.close()
+
+
+def test_padding_and_absent_suffixes_count_zero():
+  body = SUFFIX + b':0\r\n0018A45C4D1DEF81644B54AB7F969B88D65:3'
+  assert hibp.find_count(body, SUFFIX) == 0
+  assert SUFFIX not in hibp.parse_range(body)
+  assert hibp.find_count(body, b'F' * 35) == 0
+
+
+def test_cache_keeps_sources_apart(tmp_path):
+  digest = hibp.hashlib.sha1(b'chicken1').hexdigest().upper()
+  prefix, suffix = digest[:5], digest[5:].encode('ascii')
+  servers = [hibp_server.start_server({prefix: [suffix + b':3']}), hibp_server.start_server({})]
+  cache = hibp.RangeCache(tmp_path / 'ranges.sqlite3')
+  clients = [hibp.HIBP(cache=cache, base_url=f"http://127.0.0.1:{server.server_port}") for server in servers]
+  try:
+    results = [h.check_password_pwnage('chicken1') for h in clients + clients]
+    # the second round is served from the cache, each from its own server's answer
+    assert results == [(True, 3), (False, 0), (True, 3), (False, 0)]
+    assert cache.stats()['hits'] == 2 and cache.stats()['entries'] == 2
+  finally:
+    for h in clients:
+      h.session.close()
+    cache.close()
+    for server in servers:
+      server.shutdown()
+
+
+def test_cache_is_private_and_tracks_hit_ages(tmp_path):
+  path = tmp_path / 'hwtp' / 'ranges.sqlite3'
+  cache = hibp.RangeCache(path)
+  try:
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+    cache.put('ABCDE', SUFFIX + b':2\r\n' + b'F' * 35 + b':0', 'http://a/range/')
+    for _ in range(3):
+      assert cache.get('ABCDE', 'http://a/range/') == SUFFIX + b':2'
+    stats = cache.stats()
+    assert stats['hits'] == 3 and 0 <= stats['mean_hit_age'] <= stats['max_hit_age'] < 60
+  finally:
+    cache.close()
+
+
+@pytest.fixture
+def stand_in():
+  server = hibp_server.start_server(hibp_server.synthetic_hashes(0))
+  h = hibp.HIBP(base_url=f"http://127.0.0.1:{server.server_port}")
+  yield h
+  h.close()
+  server.shutdown()
+
+
+def counting_generator(pwned_every=0):
+  """generate(n) for generate_clean(); every pwned_every-th candidate is a known pwned password."""
+  made = []
+
+  def generate(n):
+    batch = []
+    for _ in range(n):
+      made.append(len(made))
+      batch.append('password' if pwned_every and len(made) % pwned_every == 0 else f"clean-{len(made)}-Zq7")
+    return batch
+  return generate, made
+
+
+def test_generate_clean_checks_no_spares_while_nothing_is_pwned(stand_in):
+  generate, made = counting_generator()
+  clean, results = stand_in.generate_clean(generate, 50, chunk=16)
+  assert len(clean) == 50 and results == [(False, 0)] * 50
+  assert len(made) == 50
+
+
+def test_generate_clean_replaces_pwned_candidates(stand_in):
+  generate, made = counting_generator(pwned_every=3)
+  clean, results = stand_in.generate_clean(generate, 40, chunk=16)
+  assert len(clean) == 40 and 'password' not in clean and len(set(clean)) == 40
+  assert results == [(False, 0)] * 40
+  # replacements plus a rate-sized spare, not a whole extra chunk per round
+  assert len(made) < 40 * 3 // 2 + 16
+  assert stand_in.last_report.seconds > 0
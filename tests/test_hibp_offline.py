@@ -0,0 +1,76 @@
+"""
+Offline HIBP index and Bloom filter: build from a small Pwned Passwords
+style file, then look every hash back up.
+"""
+import hashlib
+import random
+
+import pytest
+
+import hibp_offline
+
+
+def sha1(text):
+  return hashlib.sha1(text.encode('UTF-8')).hexdigest().upper()
+
+
+@pytest.fixture
+def pwned_file(tmp_path):
+  """A sorted HASH:COUNT file and the {hash: count} it holds."""
+  rng = random.Random(7)
+  hashes = {sha1(f"password{i}"): rng.randint(1, 100_000) for i in range(2000)}
+  hashes[sha1('password')] = 9545824
+  path = tmp_path / 'pwned.txt'
+  path.write_text(''.join(f"{h}:{c}\r\n" for h, c in sorted(hashes.items())))
+  return path, hashes
+
+
+def test_index_round_trip(pwned_file, tmp_path):
+  source, hashes = pwned_file
+  assert hibp_offline.build_index(source, tmp_path / 'pwned.idx') == len(hashes)
+  with hibp_offline.OfflineIndex(tmp_path / 'pwned.idx') as index:
+    assert index.size == len(hashes)
+    for digest, count in hashes.items():
+      assert index.lookup(digest) == count
+    for i in range(200):
+      assert index.lookup(sha1(f"not pwned {i}")) == 0
+
+
+def test_index_rejects_unsorted_files(tmp_path):
+  source = tmp_path / 'unsorted.txt'
+  source.write_text(f"{sha1('b')}:1\n{sha1('a')}:2\n" if sha1('b') > sha1('a') else f"{sha1('a')}:2\n{sha1('b')}:1\n")
+  with pytest.raises(hibp_offline.OfflineIndexError):
+    hibp_offline.build_index(source, tmp_path / 'unsorted.idx')
+
+
+def test_index_rejects_other_files(tmp_path):
+  other = tmp_path / 'other.idx'
+  other.write_bytes(b'not an index at all')
+  with pytest.raises(hibp_offline.OfflineIndexError):
+    hibp_offline.OfflineIndex(other)
+
+
+@pytest.mark.parametrize('from_index', [False, True])
+def test_filter_round_trip(pwned_file, tmp_path, from_index):
+  source, hashes = pwned_file
+  if from_index:
+    hibp_offline.build_index(source, tmp_path / 'pwned.idx')
+    source = tmp_path / 'pwned.idx'
+  assert hibp_offline.build_filter(source, tmp_path / 'pwned.bloom', fp_rate=0.01) == len(hashes)
+  with hibp_offline.BloomFilter(tmp_path / 'pwned.bloom') as bloom:
+    # no false negatives, and false positives near the requested rate
+    assert all(bloom.might_contain(digest) for digest in hashes)
+    false_positives = sum(bloom.might_contain(sha1(f"not pwned {i}")) for i in range(5000))
+    assert false_positives < 5000 * 0.03
+
+
+def test_prefilter_and_index_answer_check_many(pwned_file, tmp_path):
+  hibp = pytest.importorskip('hibp')
+  source, hashes = pwned_file
+  hibp_offline.build_index(source, tmp_path / 'pwned.idx')
+  hibp_offline.build_filter(source, tmp_path / 'pwned.bloom')
+  with hibp.HIBP(offline=hibp_offline.OfflineIndex(tmp_path / 'pwned.idx'),
+                 prefilter=hibp_offline.BloomFilter(tmp_path / 'pwned.bloom'),
+                 base_url='http://127.0.0.1:1') as client:
+    assert client.check_many(['password', 'password7', 'surely not pwned 1']) == [
+      (True, 9545824), (True, hashes[sha1('password7')]), (False, 0)]
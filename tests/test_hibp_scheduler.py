@@ -0,0 +1,115 @@
+"""
+RangeScheduler: retries with backoff, the token bucket and the circuit
+breaker, driven by a fake session instead of the network.
+"""
+import time
+
+import pytest
+import requests
+
+import hibp
+
+DIGEST = hibp.hashlib.sha1(b'chicken1').hexdigest().upper()
+PREFIX, SUFFIX = DIGEST[:5], DIGEST[5:]
+
+
+def response(status, body=b'', headers=None):
+  r = requests.Response()
+  r.status_code = status
+  r._content = body
+  r.headers.update(headers or {})
+  return r
+
+
+class FakeSession:
+  """Plays back *outcomes* (responses or exceptions to raise), one per request."""
+  def __init__(self, *outcomes):
+    self.outcomes = list(outcomes)
+    self.calls = 0
+
+  def get(self, url, headers=None, timeout=None):
+    self.calls += 1
+    outcome = self.outcomes.pop(0)
+    if isinstance(outcome, Exception):
+      raise outcome
+    return outcome
+
+  def close(self):
+    pass
+
+
+def fake_hibp(*outcomes, **kwargs):
+  h = hibp.HIBP(backoff_factor=0.001, **kwargs)
+  h.session = FakeSession(*outcomes)
+  return h
+
+
+def test_retryable_statuses_and_network_errors_are_retried():
+  h = fake_hibp(response(503), requests.exceptions.ChunkedEncodingError("cut off"),
+                response(200, f"{SUFFIX}:42".encode('ascii')))
+  assert h.check_password_pwnage('chicken1') == (True, 42)
+  assert h.session.calls == 3
+  assert h.last_report.retried == {PREFIX: 2} and not h.last_report.failed
+
+
+def test_other_errors_fail_at_once():
+  h = fake_hibp(response(404))
+  assert h.check_password_pwnage('chicken1') == (False, -1)
+  assert h.last_report.failed == {PREFIX: 'HTTP 404'}
+  # not a network hiccup: a bad URL is no better the second time
+  h = fake_hibp(requests.exceptions.InvalidURL("no host"))
+  assert h.check_password_pwnage('chicken1') == (False, -1)
+  assert h.session.calls == 1 and h.last_report.failed == {PREFIX: 'InvalidURL'}
+
+
+def test_gives_up_after_max_retries():
+  h = fake_hibp(*[requests.ConnectionError("refused")] * 3, retries=2)
+  assert h.check_password_pwnage('chicken1') == (False, -1)
+  assert h.session.calls == 3 and h.last_report.retried == {PREFIX: 2}
+
+
+def test_retry_after_sets_the_least_delay():
+  scheduler = hibp.RangeScheduler(lambda prefix: b'', backoff_factor=0.001, max_delay=5)
+  error = requests.HTTPError(response=response(429, headers={'Retry-After': '2'}))
+  assert scheduler._delay(1, error) == 2
+  error = requests.HTTPError(response=response(429, headers={'Retry-After': '600'}))
+  assert scheduler._delay(1, error) == 5
+  assert 0 <= scheduler._delay(3, requests.ConnectionError()) <= 0.008
+
+
+def test_token_bucket_limits_the_rate():
+  bucket = hibp.TokenBucket(rate=100, burst=2)
+  start = time.monotonic()
+  bucket.acquire()
+  bucket.acquire()
+  assert time.monotonic() - start < 0.01  # the burst goes out at once
+  for _ in range(10):
+    bucket.acquire()
+  assert time.monotonic() - start >= 0.09
+
+
+def test_circuit_breaker_opens_and_recovers():
+  breaker = hibp.CircuitBreaker(threshold=2, cooldown=0.05)
+  breaker.record_failure()
+  assert not breaker.is_open and breaker.allow()
+  breaker.record_failure()
+  assert breaker.is_open and not breaker.allow()
+  time.sleep(0.06)
+  # half open: one trial, and its failure opens the circuit again
+  assert breaker.allow() and not breaker.allow()
+  breaker.record_failure()
+  assert breaker.is_open and not breaker.allow()
+  time.sleep(0.06)
+  assert breaker.allow()
+  breaker.record_success()
+  assert not breaker.is_open and breaker.allow() and breaker.allow()
+
+
+def test_open_circuit_sends_nothing():
+  calls = []
+  scheduler = hibp.RangeScheduler(calls.append, breaker=hibp.CircuitBreaker(threshold=1, cooldown=60))
+  scheduler.breaker.record_failure()
+  report = hibp.BatchReport()
+  with pytest.raises(hibp.CircuitOpenError):
+    scheduler.fetch(PREFIX, report)
+  assert calls == [] and PREFIX in report.failed
@@ -0,0 +1,54 @@
+"""
+Mask mode: compiling masks, generating from them and their exact entropy.
+"""
+import math
+import string
+from collections import Counter
+
+import pytest
+
+import entropy
+import pw
+
+MASK = '?u?l?l-?d?d?s??'
+
+
+def test_mask_positions_and_literals():
+  policy = pw.compile_mask(pw.PasswordOptions(mask=MASK))
+  assert len(policy.positions) == 8
+  assert policy.positions[0] == string.ascii_uppercase and policy.positions[3] == '-' and policy.positions[7] == '?'
+  for password in pw.password().compile(mask=MASK).generate(200):
+    assert len(password) == 8
+    assert password[0].isupper() and password[1:3].islower() and password[3] == '-'
+    assert password[4:6].isdigit() and password[6] in string.punctuation and password[7] == '?'
+
+
+@pytest.mark.parametrize('mask', ['?u?x', '?l?', '', '?s'])
+def test_bad_masks_are_rejected(mask):
+  # '?s' has no specials left once every special is denied
+  options = pw.PasswordOptions(mask=mask, specials_deny=string.punctuation if mask == '?s' else '')
+  with pytest.raises(pw.PasswordError):
+    pw.compile_mask(options)
+
+
+def test_filters_shape_classes_not_literals():
+  options = pw.PasswordOptions(mask='?d?sO', ambiguous=True, specials_override='#!')
+  policy = pw.compile_mask(options)
+  assert '0' not in policy.positions[0] and '1' not in policy.positions[0]
+  assert policy.positions[1] == '#!' and policy.positions[2] == 'O'
+
+
+def test_mask_draws_are_uniform():
+  generator = pw.password().compile(mask='?d')
+  counts = Counter(generator.generate(20_000))
+  assert set(counts) == set(string.digits)
+  # each digit should land close to 2000; 5 sigma is about 212
+  assert all(abs(c - 2000) < 250 for c in counts.values())
+
+
+def test_mask_entropy_is_exact():
+  policy = pw.compile_mask(pw.PasswordOptions(mask=MASK))
+  assert entropy.mask_count(policy) == 26 ** 3 * 10 ** 2 * len(policy.positions[6])
+  assert entropy.mask_entropy(policy) == pytest.approx(math.log2(entropy.mask_count(policy)))
+  report = pw.password().compile(mask=MASK).entropy_report()
+  assert report['num_chars'] == 8 and report['valid_passwords'] == str(entropy.mask_count(policy))
@@ -0,0 +1,16 @@
+"""
+Passphrase generation from the processed dictionaries in cache/.
+"""
+import pytest
+
+import pp
+
+
+@pytest.mark.parametrize('dictionary', ['eff_large_wordlist', 'russian'])
+def test_fixed_words_use_str_capitalize(dictionary):
+  gen = pp.passphrase(dictionary=dictionary)
+  expected = {w.capitalize() for w in gen.wordlist}
+  for _ in range(50):
+    words = gen.get_random_words_from_list(4)
+    assert len(set(words)) == 4
+    assert set(words) <= expected
@@ -0,0 +1,55 @@
+"""
+Password generation: the uniform sampler (entropy.PolicyCounter.sample) and
+the fallback builders used for policies too large to count.
+"""
+import collections
+
+import pytest
+
+import entropy
+import pw
+from test_entropy import SMALL_POLICIES, brute_force, is_valid
+
+# larger policies, with every rule that changes how a password is built
+LARGE_POLICIES = [
+  dict(num_chars=12, min_digits=2, min_specials=3),
+  dict(num_chars=12, min_digits=2, min_specials=3, no_consecutives=True),
+  dict(num_chars=10, min_digits=1, min_specials=1, bookend=True, no_consecutives=True, ambiguous=True),
+  dict(num_chars=9, specials_override='#', min_specials=4, no_consecutives=True),
+  dict(num_chars=9, specials_override='#', min_specials=3, bookend=True, no_consecutives=True, extra_shuffle=True),
+  dict(num_chars=6, uppercase=False, lowercase=False, specials_override='#!', min_digits=2, no_consecutives=True),
+]
+
+
+@pytest.mark.parametrize('kwargs', SMALL_POLICIES + LARGE_POLICIES)
+def test_sampled_passwords_meet_the_policy(kwargs):
+  generator = pw.password().compile(**kwargs)
+  assert generator._counter is not None or generator._positions is not None
+  for password in generator.generate(500):
+    assert is_valid(password, generator.policy), password
+
+
+def test_sampler_reaches_every_password_evenly():
+  generator = pw.password().compile(**SMALL_POLICIES[4])
+  valid = set(brute_force(generator.policy))
+  seen = collections.Counter(generator.generate(40 * len(valid)))
+  assert set(seen) == valid
+  # 40 draws expected per password: anything outside 10..90 would be far out of line
+  assert 10 <= min(seen.values()) and max(seen.values()) <= 90
+
+
+@pytest.fixture
+def no_exact_counting(monkeypatch):
+  # force the builders used for policies too large to count
+  monkeypatch.setattr(entropy, 'MAX_TABLE_CELLS', 0)
+  pw.compile_policy.cache_clear()
+  yield
+  pw.compile_policy.cache_clear()
+
+
+@pytest.mark.parametrize('kwargs', SMALL_POLICIES + LARGE_POLICIES)
+def test_fallback_passwords_meet_the_policy(no_exact_counting, kwargs):
+  generator = pw.password().compile(**kwargs)
+  assert generator._counter is None
+  for password in generator.generate(500):
+    assert is_valid(password, generator.policy), password
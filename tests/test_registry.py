@@ -0,0 +1,35 @@
+"""
+DictionaryRegistry: shared loading of processed dictionaries.
+"""
+import threading
+import time
+
+import registry
+
+
+def test_cold_load_does_not_block_warm_hits(monkeypatch):
+  load = registry.Dictionary.load
+  started = threading.Event()
+
+  def slow_load(name):
+    if name == 'russian':
+      started.set()
+      time.sleep(0.5)
+    return load(name)
+
+  monkeypatch.setattr(registry.Dictionary, 'load', staticmethod(slow_load))
+  reg = registry.DictionaryRegistry()
+  warm = reg.get('eff_large_wordlist')
+  results = []
+  threads = [threading.Thread(target=lambda: results.append(reg.get('russian'))) for _ in range(4)]
+  for t in threads:
+    t.start()
+  started.wait()
+  start = time.perf_counter()
+  assert reg.get('eff_large_wordlist') is warm
+  assert time.perf_counter() - start < 0.25
+  for t in threads:
+    t.join()
+  # four threads asked for the cold dictionary, but it was loaded once and shared
+  assert len(results) == 4 and all(d is results[0] for d in results)
+  assert reg.misses == 2
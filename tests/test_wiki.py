@@ -0,0 +1,136 @@
+"""
+TitlePool: taking titles without reuse, refilling and persistence.
+Title corpora: building one from a dump and sampling it.
+"""
+import gzip
+import itertools
+import json
+import os
+import stat
+import threading
+
+import pytest
+import requests
+
+import wiki
+
+
+class FakeResponse:
+  def __init__(self, titles):
+    self.titles = titles
+
+  def raise_for_status(self):
+    pass
+
+  def json(self):
+    return {"query": {"random": [{"title": t} for t in self.titles]}}
+
+
+class FakeSession:
+  """Answers list=random with fresh numbered titles, or fails when *down*."""
+  def __init__(self, down=False):
+    self.down = down
+    self.calls = 0
+    self._ids = itertools.count()
+    self._lock = threading.Lock()
+
+  def get(self, url, params, timeout):
+    with self._lock:
+      self.calls += 1
+      if self.down:
+        raise requests.ConnectionError("no network")
+      return FakeResponse([f"Title {next(self._ids)}" for _ in range(int(params["rnlimit"]))])
+
+
+def make_pool(path, session, **kwargs):
+  return wiki.TitlePool(path=path, session=session, background=False, **kwargs)
+
+
+def test_take_refills_and_persists(tmp_path):
+  path = tmp_path / 'hwtp' / 'titles.json'
+  session = FakeSession()
+  pool = make_pool(path, session, target=1000, low_water=100)
+  taken = pool.take(30)
+  assert len(taken) == 30 and len(set(taken)) == 30
+  # refilled to target in two concurrent pages, then 30 taken out
+  assert session.calls == 2
+  assert len(pool) == 970
+  saved = json.loads(path.read_text(encoding='utf-8'))
+  assert len(saved) == 970 and not set(saved) & set(taken)
+  # a new pool picks up the saved titles and needs no network
+  again = make_pool(path, FakeSession(down=True), target=1000, low_water=100)
+  assert len(again) == 970
+  assert not set(again.take(50)) & set(taken)
+
+
+def test_pool_file_is_private(tmp_path):
+  path = tmp_path / 'hwtp' / 'titles.json'
+  make_pool(path, FakeSession(), target=10).take(1)
+  assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+  assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+
+
+def test_take_is_random(tmp_path):
+  path = tmp_path / 'titles.json'
+  titles = [f"Title {i}" for i in range(1000)]
+  path.write_text(json.dumps(titles), encoding='utf-8')
+  taken = make_pool(path, FakeSession(down=True)).take(20)
+  # not simply the head or the tail of the file
+  assert taken != titles[:20] and taken != titles[-20:]
+
+
+def test_two_pools_never_hand_out_the_same_title(tmp_path):
+  path = tmp_path / 'titles.json'
+  path.write_text(json.dumps([f"Title {i}" for i in range(400)]), encoding='utf-8')
+  # two pools over one file, each with a stale in-memory copy
+  pools = [make_pool(path, FakeSession(down=True)) for _ in range(2)]
+  results = [[], []]
+
+  def worker(i):
+    for _ in range(20):
+      results[i].extend(pools[i].take(5))
+
+  threads = [threading.Thread(target=worker, args=(i,)) for i in range(2)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  taken = results[0] + results[1]
+  assert len(taken) == 200 and len(set(taken)) == 200
+  left = json.loads(path.read_text(encoding='utf-8'))
+  assert len(left) == 200 and not set(left) & set(taken)
+
+
+def test_take_raises_when_wikipedia_is_down(tmp_path):
+  pool = make_pool(tmp_path / 'titles.json', FakeSession(down=True))
+  with pytest.raises(requests.RequestException):
+    pool.take(3)
+
+
+DUMP = ['page_title', 'Apple', 'Banana_(fruit)', 'Cherry-Pie', 'Apple', 'Date', 'Éclair', '(Nothing)', 'A_very_long_title_indeed']
+
+
+def test_build_and_sample_title_corpus(tmp_path):
+  dump = tmp_path / 'titles.gz'
+  with gzip.open(dump, 'wt', encoding='utf-8') as f:
+    f.write('\n'.join(DUMP) + '\n')
+  corpus_path = tmp_path / 'titles.corpus'
+  # the header line, the duplicate, the empty cleaned title and the too long one are dropped
+  assert wiki.build_title_corpus(dump, corpus_path, max_length=10) == 5
+  with wiki.TitleCorpus(corpus_path) as corpus:
+    assert sorted(corpus.title(i) for i in range(corpus.size)) == ['Apple', 'Banana', 'CherryPie', 'Date', 'Éclair']
+    assert corpus.counts == {4: 1, 5: 1, 6: 2, 9: 1}
+    for titles in corpus.sample(2, num_reps=50, num_chars=10):
+      assert len(''.join(titles)) == 10
+    with pytest.raises(wiki.TitleCorpusError):
+      corpus.sample(1, num_chars=7)
+
+
+def test_damaged_corpus_is_rejected(tmp_path):
+  dump = tmp_path / 'titles.txt'
+  dump.write_text('\n'.join(DUMP), encoding='utf-8')
+  corpus_path = tmp_path / 'titles.corpus'
+  wiki.build_title_corpus(dump, corpus_path)
+  corpus_path.write_bytes(corpus_path.read_bytes()[:-3])
+  with pytest.raises(wiki.TitleCorpusError):
+    wiki.TitleCorpus(corpus_path)
@@ -0,0 +1,401 @@
+"""
+Halt! What's the Passphrase?
+Wikipedia article titles for -w passphrases.
+
+TitlePool keeps a local pool of random article titles, persisted to disk and
+refilled from the MediaWiki API in maximum-size pages (fetched concurrently
+when a large -n needs several), so most -w runs need no network round trip
+at all. Titles are drawn from the pool at random and never handed out twice,
+even to several processes sharing the pool file.
+
+For air-gapped hosts, build_title_corpus() turns a titles dump (such as
+enwiki-latest-all-titles-in-ns0.gz) into a corpus of de_wikify()-cleaned
+titles grouped by cleaned length, and TitleCorpus memory-maps it so titles
+are sampled locally with a CSPRNG, optionally adding up to a target length.
+
+Corpus layout (all integers little-endian):
+  header   CORPUS_MAGIC, max length (uint64), title count (uint64)
+  lengths  max length + 2 uint64 title indexes: titles of cleaned length L are [lengths[L], lengths[L + 1])
+  offsets  title count + 1 uint32 byte offsets into the text
+  text     UTF-8 cleaned titles, sorted by length
+"""
+
+# Standard library imports
+import os
+import re
+import sys
+import gzip
+import mmap
+import json
+import struct
+import secrets
+from array import array
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+try:
+    import fcntl
+except ImportError:  # Windows: the pool is then only guarded within one process
+    fcntl = None
+
+# Third party imports
+import requests
+from requests.adapters import HTTPAdapter
+
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+USER_AGENT = "Halt! What's the Passphrase? 1.0 Contact [unicornoverloaded@gmail.com]"
+
+# most titles one list=random request may ask for (rnlimit) without bot rights
+RNLIMIT_MAX = 500
+
+# pages of RNLIMIT_MAX titles fetched at once when a large request needs several
+MAX_WORKERS = 4
+
+# TITLE POOL DEFAULTS
+# kept outside the repo, next to the HIBP range cache: the pool is per user state
+DEFAULT_POOL_PATH = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'hwtp' / 'wikipedia_titles.json'
+DEFAULT_POOL_TARGET = 2000  # titles held after a refill
+DEFAULT_POOL_LOW_WATER = 500  # refill in the background once fewer are left
+
+_crypto = secrets.SystemRandom()
+
+# OFFLINE CORPUS
+CORPUS_MAGIC = b'HWTPTTL1'
+CORPUS_HEADER = struct.Struct('<8sQQ')
+DEFAULT_MAX_TITLE_LENGTH = 40  # longer cleaned titles make unwieldy passphrases and are left out
+
+
+class WikipediaError(RuntimeError):
+    """Raised when not enough titles can be fetched from Wikipedia."""
+
+
+def make_session(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """A keep-alive session for the MediaWiki API."""
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept": "application/json",
+    })
+    session.mount('https://', adapter)
+    return session
+
+
+class TitlePool:
+    """
+    Random Wikipedia article titles persisted in a JSON file. take() hands out
+    randomly chosen titles from the pool without reuse and saves what is left;
+    when the pool runs short it is refilled on demand, and with *background*
+    a daemon thread also refills it to target once it drops below low_water.
+    Thread-safe, and safe across processes sharing the file where fcntl is
+    available: every read-modify-write of the file holds an exclusive lock.
+    """
+    def __init__(self, path: Path = DEFAULT_POOL_PATH, target: int = DEFAULT_POOL_TARGET,
+                 low_water: int = DEFAULT_POOL_LOW_WATER, timeout: float = 5,
+                 session: requests.Session | None = None, max_workers: int = MAX_WORKERS,
+                 background: bool = True):
+        self.path = Path(path)
+        self.target = target
+        self.low_water = low_water
+        self.timeout = timeout
+        self.max_workers = max(1, max_workers)
+        self.background = background
+        self.session = session or make_session(self.max_workers)
+        self.fetched = 0  # titles fetched from the API by this object
+        self._lock = threading.Lock()
+        self._refilling = None  # background refill thread, if one is running
+        self.titles = self._load()  # the pool as last read or written by this object
+
+    def _load(self) -> List[str]:
+        try:
+            with self.path.open('r', encoding='utf-8') as f:
+                titles = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [t for t in titles if isinstance(t, str)] if isinstance(titles, list) else []
+
+    def _save(self):
+        # caller holds the file lock; write then rename so an interrupted save never leaves half a file
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix='.tmp')  # created 0600
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.titles, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock and an exclusive lock on the pool file, then re-read the pool."""
+        with self._lock:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd = os.open(self.path.with_name(self.path.name + '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                self.titles = self._load()
+                yield
+            finally:
+                os.close(fd)  # releases the flock
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def _fetch_batch(self, limit: int = RNLIMIT_MAX) -> List[str]:
+        """One list=random request for up to *limit* (at most RNLIMIT_MAX) titles."""
+        params = {
+            "action": "query",
+            "format": "json",
+            "list": "random",
+            "rnnamespace": "0",
+            "rnlimit": str(min(limit, RNLIMIT_MAX)),
+        }
+        response = self.session.get(url=WIKI_API_URL, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return [item["title"] for item in response.json()["query"]["random"]]
+
+    def refill(self, want: int | None = None):
+        """
+        Fetch full pages until the pool holds at least *want* (default: target)
+        titles. The pages still missing are fetched concurrently, at most
+        max_workers at a time over the pooled session, and merged without
+        duplicates; pages that come back short are made up in the next round.
+        The file is only locked to merge, never while waiting on the network.
+        """
+        want = self.target if want is None else want
+        while True:
+            with self._locked():
+                missing = want - len(self.titles)
+            if missing <= 0:
+                return
+            pages = -(-missing // RNLIMIT_MAX)
+            if pages == 1:
+                batches = [self._fetch_batch(RNLIMIT_MAX)]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, pages)) as workers:
+                    batches = list(workers.map(self._fetch_batch, [RNLIMIT_MAX] * pages))
+            with self._locked():
+                before = len(self.titles)
+                held = set(self.titles)
+                for batch in batches:
+                    for title in batch:
+                        if title not in held:
+                            held.add(title)
+                            self.titles.append(title)
+                    self.fetched += len(batch)
+                added = len(self.titles) - before
+                self._save()
+            if added == 0:
+                raise WikipediaError("Wikipedia returned no new titles.")
+
+    def refill_in_background(self):
+        """Start a refill to target on a daemon thread, unless one is already running."""
+        with self._lock:
+            if self._refilling is not None and self._refilling.is_alive():
+                return
+            self._refilling = threading.Thread(target=self._background_refill, daemon=True)
+            self._refilling.start()
+
+    def _background_refill(self):
+        try:
+            self.refill()
+        except (requests.RequestException, WikipediaError, ValueError, KeyError, OSError):
+            pass  # the next take() fetches on demand and reports the problem
+
+    def take(self, n: int) -> List[str]:
+        """
+        Remove and return *n* titles chosen at random from the pool. Refills to
+        target first if the pool holds fewer; raises requests.RequestException
+        or WikipediaError if it cannot.
+        """
+        while True:
+            with self._locked():
+                if len(self.titles) >= n:
+                    picks = _crypto.sample(range(len(self.titles)), n)
+                    taken = [self.titles[i] for i in picks]
+                    chosen = set(picks)
+                    self.titles = [t for i, t in enumerate(self.titles) if i not in chosen]
+                    self._save()
+                    remaining = len(self.titles)
+                    break
+            self.refill(max(self.target, n + self.low_water))
+        if self.background and remaining < self.low_water:
+            self.refill_in_background()
+        return taken
+
+
+class TitleCorpusError(ValueError):
+    """Raised when a titles dump or corpus file is unusable."""
+
+
+def de_wikify(text: str) -> str:
+    """
+    Clean a title for a passphrase: drop (parenthesised) and [bracketed]
+    parts, split on spaces, underscores and hyphens, keep letters and digits
+    and capitalize each word.
+    """
+    text = re.sub(r"[\(\[].*?[\)\]]", "", text).strip()
+    text = text.replace('_', ' ').replace('-', ' ')
+    cleaned = ''
+    for word in text.split():
+        for idx, ch in enumerate(word):
+            if ch.isalnum():
+                cleaned += ch.upper() if idx == 0 else ch
+    return cleaned
+
+
+def _open_dump(path: Path):
+    return gzip.open(path, 'rt', encoding='utf-8', errors='replace') if path.suffix == '.gz' else path.open('r', encoding='utf-8', errors='replace')
+
+
+def build_title_corpus(source, destination, max_length: int = DEFAULT_MAX_TITLE_LENGTH, verbose: bool = False) -> int:
+    """
+    Build a title corpus at *destination* from a titles dump (one title per
+    line, underscores for spaces, optionally gzipped). Every title is cleaned
+    with de_wikify(); empty results, titles longer than *max_length* and
+    duplicates are dropped. Returns the number of titles stored.
+    """
+    source = Path(source)
+    destination = Path(destination)
+    with tempfile.TemporaryDirectory() as tmp:
+        # pass 1: spread cleaned titles over one file per length, so only one length is ever held in memory
+        buckets = {}
+        with _open_dump(source) as lines:
+            for line_no, line in enumerate(lines, 1):
+                title = line.rstrip('\n')
+                if not title or (line_no == 1 and title == 'page_title'):
+                    continue
+                cleaned = de_wikify(title)
+                length = len(cleaned)
+                if 0 < length <= max_length:
+                    if length not in buckets:
+                        buckets[length] = open(Path(tmp) / f"{length}.txt", 'w', encoding='utf-8')
+                    buckets[length].write(cleaned + '\n')
+                if verbose and line_no % 1_000_000 == 0:
+                    print(f"Cleaned {line_no:,} titles...")
+        for bucket in buckets.values():
+            bucket.close()
+
+        # pass 2: dedupe and sort each length, then write the offsets and text
+        starts = [0] * (max_length + 2)
+        offsets = array('I', [0])  # 4 bytes per title, where a list of ints takes about 36
+        end = 0
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryFile(dir=tmp) as text:
+            total = 0
+            for length in range(max_length + 1):
+                starts[length] = total
+                if length not in buckets:
+                    continue
+                with (Path(tmp) / f"{length}.txt").open('r', encoding='utf-8') as bucket:
+                    titles = sorted(set(bucket.read().split('\n')) - {''})
+                for title in titles:
+                    encoded = title.encode('utf-8')
+                    text.write(encoded)
+                    end += len(encoded)
+                    if end > 0xFFFFFFFF:
+                        raise TitleCorpusError(f"{source} holds too much title text for one corpus; lower the maximum title length.")
+                    offsets.append(end)
+                total += len(titles)
+            starts[max_length + 1] = total
+            text.seek(0)
+            with destination.open('wb') as out:
+                out.write(CORPUS_HEADER.pack(CORPUS_MAGIC, max_length, total))
+                out.write(struct.pack(f'<{max_length + 2}Q', *starts))
+                if sys.byteorder == 'big':
+                    offsets.byteswap()
+                offsets.tofile(out)
+                while chunk := text.read(16 * 1024 * 1024):
+                    out.write(chunk)
+    if verbose:
+        print(f"Stored {total:,} distinct cleaned titles from {source} in {destination}.")
+    return total
+
+
+class TitleCorpus:
+    """
+    Memory-mapped corpus built by build_title_corpus(). sample() draws titles
+    with secrets.randbelow: uniformly from the whole corpus, or uniformly among
+    all title combinations whose cleaned lengths add up to num_chars.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = self.path.open('rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise TitleCorpusError(f"{self.path} is empty, not a title corpus.") from None
+        magic, self.max_length, self.size = CORPUS_HEADER.unpack_from(self._mm, 0) if len(self._mm) >= CORPUS_HEADER.size else (b'', 0, 0)
+        if magic != CORPUS_MAGIC:
+            self.close()
+            raise TitleCorpusError(f"{self.path} is not a title corpus (build one with: hwtp.py utils build-titles).")
+        expected = CORPUS_HEADER.size + (self.max_length + 2) * 8 + (self.size + 1) * 4
+        if len(self._mm) < expected or len(self._mm) != expected + struct.unpack_from('<I', self._mm, expected - 4)[0]:
+            self.close()
+            raise TitleCorpusError(f"{self.path} is truncated or damaged; rebuild it with: hwtp.py utils build-titles.")
+        self._starts = struct.unpack_from(f'<{self.max_length + 2}Q', self._mm, CORPUS_HEADER.size)
+        self._offsets = CORPUS_HEADER.size + (self.max_length + 2) * 8
+        self._text = self._offsets + (self.size + 1) * 4
+        # titles per cleaned length
+        self.counts = {length: self._starts[length + 1] - self._starts[length]
+                       for length in range(self.max_length + 1) if self._starts[length + 1] > self._starts[length]}
+
+    def title(self, index: int) -> str:
+        start, end = struct.unpack_from('<II', self._mm, self._offsets + index * 4)
+        return self._mm[self._text + start:self._text + end].decode('utf-8')
+
+    def _ways(self, num_titles: int, num_chars: int) -> List[List[int]]:
+        # ways[k][s]: ordered combinations of k titles whose lengths add up to s
+        ways = [[0] * (num_chars + 1) for _ in range(num_titles + 1)]
+        ways[0][0] = 1
+        for k in range(1, num_titles + 1):
+            for total in range(num_chars + 1):
+                ways[k][total] = sum(count * ways[k - 1][total - length]
+                                     for length, count in self.counts.items() if length <= total)
+        return ways
+
+    def sample(self, num_titles: int, num_reps: int = 1, num_chars: int | None = None, randbelow=secrets.randbelow) -> List[List[str]]:
+        """
+        *num_reps* lists of *num_titles* cleaned titles. With *num_chars*, the
+        titles of each list add up to exactly num_chars characters; raises
+        TitleCorpusError if no combination does.
+        """
+        if self.size == 0:
+            raise TitleCorpusError(f"{self.path} holds no titles.")
+        if num_chars is None:
+            return [[self.title(randbelow(self.size)) for _ in range(num_titles)] for _ in range(num_reps)]
+        ways = self._ways(num_titles, num_chars)
+        if ways[num_titles][num_chars] == 0:
+            raise TitleCorpusError(f"No {num_titles} titles in {self.path} add up to exactly {num_chars} characters.")
+        result = []
+        for _ in range(num_reps):
+            titles = []
+            remaining = num_chars
+            for k in range(num_titles, 0, -1):
+                # pick this title's length in proportion to how many combinations it leaves
+                pick = randbelow(ways[k][remaining])
+                for length, count in self.counts.items():
+                    weight = count * ways[k - 1][remaining - length] if length <= remaining else 0
+                    if pick < weight:
+                        break
+                    pick -= weight
+                titles.append(self.title(self._starts[length] + pick // ways[k - 1][remaining - length]))
+                remaining -= length
+            result.append(titles)
+        return result
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()